@@ -1,8 +1,17 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import data 
 import simulation 
+import scheduler
+import metrics
+import tiebreakers
+import resultcache
 import time
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
 st.set_page_config(page_title="Europa Fußball KI", layout="wide")
@@ -20,10 +29,10 @@ except Exception:
 LEAGUES = {
     "Bundesliga": {"id": 2002, "logo": "🇩🇪", "color": "#FF0000"},
     "Premier League": {"id": 2021, "logo": "🏴󠁧󠁢󠁥󠁮󠁧󠁿", "color": "#38003c"},
-    "La Liga": {"id": 2014, "logo": "🇪🇸", "color": "#ee8707"},
-    "Serie A": {"id": 2019, "logo": "🇮🇹", "color": "#008fd7"},
+    "La Liga": {"id": 2014, "logo": "🇪🇸", "color": "#ee8707", "tiebreak": "head_to_head"},
+    "Serie A": {"id": 2019, "logo": "🇮🇹", "color": "#008fd7", "tiebreak": "head_to_head"},
     "Ligue 1": {"id": 2015, "logo": "🇫🇷", "color": "#dae025"},
-    "Champions League": {"id": 2001, "logo": "🇪🇺", "color": "#0e1e5b"},
+    "Champions League": {"id": 2001, "logo": "🇪🇺", "color": "#0e1e5b", "tiebreak": "uefa"},
 }
 
 # --- STATE INITIALISIERUNG ---
@@ -54,26 +63,71 @@ TEAM_TRANSLATION = {
 
 def translate_team(name): return TEAM_TRANSLATION.get(name, name)
 
-# --- ZENTRALE LADE-FUNKTION (GLOBAL CACHED) ---
-@st.cache_data(ttl=3600) # Speichert die Daten 1 Stunde lang GLOBAL
-def fetch_and_simulate_league(league_name):
-    """
-    Lädt Matches & Torschützen UND führt die Simulation durch.
-    Dieses Ergebnis ist global (für alle Nutzer) gültig.
-    """
-    config = LEAGUES[league_name]
-    matches, logo_mapping = data.fetch_matches_external(API_KEY, config["id"])
-    
-    # Defaults
-    result = {
+def empty_result():
+    return {
         "table": pd.DataFrame(), "prognose": pd.DataFrame(), "kicktipp": pd.DataFrame(),
         "scorers": pd.DataFrame(), "bracket": pd.DataFrame(), "leader": "-", "leader_logo": "",
-        "champ_pred": "-", "top_scorer": "-", "last_updated": datetime.now().strftime("%d.%m. %H:%M")
+        "champ_pred": "-", "top_scorer": "-", "last_updated": datetime.now().strftime("%d.%m. %H:%M"),
+        "hot": False, "live": False, "precision": {}, "matches": None, "error": None
     }
-    
-    if matches.empty: return result
 
-    table = data.calculate_current_table(matches)
+def has_hot_matches(matches, window_hours=3):
+    """Laufende oder gerade beendete Spiele (Anstoß in den letzten Stunden) -> Liga öfter aktualisieren."""
+    now = np.datetime64(pd.Timestamp.now(tz="UTC").tz_convert(None))
+    recent = (matches.dates <= now) & (matches.dates >= now - np.timedelta64(window_hours, 'h'))
+    return bool(recent.any())
+
+# --- ZENTRALE LADE-FUNKTION (LÄUFT IM HINTERGRUND) ---
+def compute_league(league_name):
+    """
+    Lädt Matches & Torschützen UND führt die Simulation durch.
+    Wird nur vom Hintergrund-Scheduler aufgerufen, das Ergebnis ist global (für alle Nutzer) gültig.
+    Jede Phase wird als Timing-Span im Refresh-Protokoll der Liga erfasst.
+    """
+    with metrics.refresh(league_name):
+        result = _compute_league(league_name)
+    try:
+        metrics.write()
+    except OSError as e:
+        print(f"Fehler Metrik-Export: {e}")
+    return result
+
+def _compute_league(league_name):
+    config = LEAGUES[league_name]
+    # Matches & Torschützen parallel laden. Der Scheduler will den aktuellen Stand: nicht mehr frische Einträge
+    # werden sofort revalidiert (auch bei heißen Ligen innerhalb des SWR-Fensters), alte Daten nur bei API-Fehler.
+    # Live-Polling (jede Minute): nur die Spielpläne, Torschützen höchstens im Takt heißer Ligen (sonst > 10 Requests/min)
+    previous = get_scheduler().get(league_name, timeout=0)
+    scorers_fresh = scheduler.HOT_REFRESH_SECONDS if previous is not None and previous.get("live") else None
+    with metrics.span('fetch'):
+        matches, logo_mapping, scorers = data.fetch_league_bundle(API_KEY, config["id"], revalidate=True,
+                                                                  scorers_fresh_seconds=scorers_fresh)
+    live = bool(matches.live.any())
+    if matches.empty: return empty_result()
+    # Vorsaisons fürs Stärkemodell: nur, was schon lokal vorliegt. Fehlende Saisons lädt ein Hintergrund-Backfill,
+    # danach rechnet die Liga mit Historie neu (der erste Refresh wartet nicht auf die Requests der Vorsaisons)
+    season_year = data.season_start_year(matches)
+    history = data.fetch_history_store(API_KEY, config["id"], season_year, cached_only=True)
+    data.backfill_history_in_background(API_KEY, config["id"], season_year,
+                                        on_done=lambda: get_scheduler().refresh(league_name))
+
+    # Gleicher Datenstand + gleiche Modellversion -> fertiges Ergebnis wiederverwenden, keine neue Simulation
+    key = resultcache.result_key(league_name, simulation.matches_snapshot_key(matches), history.snapshot_key(),
+                                 resultcache.frame_digest(scorers), simulation.MODEL_VERSION)
+    cache = get_result_cache()
+    result = cache.get(key)
+    if result is None:
+        result = _build_result(league_name, config, matches, history, logo_mapping, scorers)
+        if result["error"] is None: cache.put(key, result) # Fehlgeschlagene Simulation beim nächsten Refresh neu versuchen
+    return dict(result, hot=has_hot_matches(matches), live=live) # "Heiß" hängt an der Uhrzeit, nicht am Datenstand
+
+def _build_result(league_name, config, matches, history, logo_mapping, scorers):
+    result = empty_result()
+    result["matches"] = matches # Kompakter MatchStore des Stands, auf dem dieses Ergebnis beruht
+    tiebreak = config.get("tiebreak", tiebreakers.DEFAULT_TIEBREAK)
+
+    with metrics.span('table'):
+        table = data.calculate_current_table(simulation.league_phase(matches), tiebreak) # CL: ohne K.O.-Spiele
     is_cl = (league_name == "Champions League")
     
     # Leader Info
@@ -82,34 +136,32 @@ def fetch_and_simulate_league(league_name):
         result["leader"] = translate_team(leader_raw)
         result["leader_logo"] = logo_mapping.get(leader_raw, "")
 
+    # Seed aus dem Match-Stand: ohne neue Ergebnisse bleibt das Bracket identisch
+    bracket_rng = simulation.spawn_generators(simulation.snapshot_seed(matches), 2)[1]
+
     try:
-        prognose_raw = simulation.simulate_season(matches, table, n_simulations=500, is_cl=is_cl)
+        # Inkrementell: setzt auf der letzten Simulation der Liga auf, feste Zufallszahlen pro Saison und Paarung
+        # (40.000 Simulationen -> jede Wahrscheinlichkeit auf ±0.25 %-Pkt. genau)
+        cache = get_result_cache()
+        season_seed = simulation.stable_key(league_name, data.season_start_year(matches))
+        prognose_raw, state = run_on_pool(
+            simulation.simulate_season_incremental, matches, table, cache.get(resultcache.state_key(league_name)),
+            is_cl=is_cl, seed=season_seed, history=history, tiebreak=tiebreak)
+        cache.put(resultcache.state_key(league_name), state) # Zählt zum Speicherbudget des Ergebnis-Caches
+        result["precision"] = dict(prognose_raw.attrs)
         
         # CL Bracket
         if is_cl:
-            cl_bracket = simulation.generate_cl_bracket(matches, table)
+            with metrics.span('bracket'):
+                cl_bracket = simulation.generate_cl_bracket(matches, table, rng=bracket_rng, history=history)
             if not cl_bracket.empty:
                 cl_bracket['Heim'] = cl_bracket['Heim'].apply(translate_team)
                 cl_bracket['Gast'] = cl_bracket['Gast'].apply(translate_team)
                 cl_bracket['Sieger'] = cl_bracket['Sieger'].apply(translate_team)
                 result["bracket"] = cl_bracket
 
-        # Prognose aufräumen
-        cols = ['Titel', 'Top8', 'Playoff', 'Out', 'Meister', 'CL', 'EL', 'ConfL', 'Abstieg', 'AvgPoints']
-        for c in cols:
-            if c not in prognose_raw.columns: prognose_raw[c] = 0.0
-        
-        prognose_raw['AvgPoints'] = prognose_raw['AvgPoints'].round(0).astype(int)
-        prognose_raw['Team'] = prognose_raw.index
-        prognose_raw = prognose_raw.reset_index(drop=True)
-        prognose_raw.insert(0, 'Platz', range(1, 1 + len(prognose_raw)))
-        prognose_raw['Wappen'] = prognose_raw['Team'].map(lambda x: logo_mapping.get(x, ""))
-        prognose_raw['DisplayTeam'] = prognose_raw['Team'].apply(translate_team)
-        
-        keep_cols = ['Platz', 'Wappen', 'DisplayTeam', 'AvgPoints']
-        keep_cols += ['Titel', 'Top8', 'Playoff', 'Out'] if is_cl else ['Meister', 'CL', 'EL', 'ConfL', 'Abstieg']
-        
-        result["prognose"] = prognose_raw[keep_cols]
+        prognose_raw = format_prognose(prognose_raw, logo_mapping, is_cl)
+        result["prognose"] = prognose_raw
         
         # Meister/Sieger für Dashboard
         if not prognose_raw.empty:
@@ -118,18 +170,21 @@ def fetch_and_simulate_league(league_name):
             result["champ_pred"] = champ_row['DisplayTeam']
 
     except Exception as e:
+        metrics.incr('simulation_errors')
+        result["error"] = str(e)
         print(f"Fehler Simulation {league_name}: {e}")
 
     # Kicktipp
     next_n = 18 if is_cl else (9 if league_name in ["Bundesliga", "Ligue 1"] else 10)
-    kicktipp = simulation.predict_upcoming_matches(matches, next_n=next_n)
+    with metrics.span('kicktipp'):
+        kicktipp = simulation.predict_upcoming_matches(matches, next_n=next_n, history=history)
     if not kicktipp.empty:
-        kicktipp['Anstoß'] = kicktipp['Datum'].dt.strftime('%d.%m. %H:%M')
+        kicktipp['Anstoß'] = kicktipp['Datum'].dt.strftime('%d.%m. %H:%M').where(kicktipp['Live'] == "", "🔴 " + kicktipp['Live'])
         kicktipp['HeimWappen'] = kicktipp['Heim'].map(lambda x: logo_mapping.get(x, ""))
         kicktipp['GastWappen'] = kicktipp['Auswärts'].map(lambda x: logo_mapping.get(x, ""))
         kicktipp['Heim'] = kicktipp['Heim'].apply(translate_team)
         kicktipp['Auswärts'] = kicktipp['Auswärts'].apply(translate_team)
-        kicktipp = kicktipp[['Anstoß', 'HeimWappen', 'Heim', 'GastWappen', 'Auswärts', 'Tipp', '1', 'X', '2']]
+        kicktipp = kicktipp[['Anstoß', 'HeimWappen', 'Heim', 'GastWappen', 'Auswärts', 'Tipp', '1', 'X', '2', 'Über 2.5', 'Beide treffen']]
         result["kicktipp"] = kicktipp
 
     # Tabelle Finalisieren
@@ -140,7 +195,6 @@ def fetch_and_simulate_league(league_name):
     result["table"] = table
 
     # Scorers
-    scorers = data.fetch_scorers_external(API_KEY, config["id"])
     if not scorers.empty:
         scorers['Wappen'] = scorers['Team'].map(lambda x: logo_mapping.get(x, ""))
         scorers['Team'] = scorers['Team'].apply(translate_team)
@@ -161,20 +215,101 @@ def fetch_and_simulate_league(league_name):
 
     return result
 
-# --- SICHERE PRÜFUNG DES CACHE STATUS ---
+def format_prognose(prognose_raw, logo_mapping, is_cl):
+    """Simulationsergebnis (Prozente pro Team) -> Anzeige-Tabelle mit Platz, Wappen und übersetztem Namen."""
+    cols = ['Titel', 'Top8', 'Playoff', 'Achtelfinale', 'Viertelfinale', 'Halbfinale', 'Finale', 'Out', 'Meister', 'CL', 'EL', 'ConfL', 'Abstieg', 'AvgPoints']
+    for c in cols:
+        if c not in prognose_raw.columns: prognose_raw[c] = 0.0
+    
+    prognose_raw['AvgPoints'] = prognose_raw['AvgPoints'].round(0).astype(int)
+    prognose_raw['Team'] = prognose_raw.index
+    prognose_raw = prognose_raw.reset_index(drop=True)
+    prognose_raw.insert(0, 'Platz', range(1, 1 + len(prognose_raw)))
+    prognose_raw['Wappen'] = prognose_raw['Team'].map(lambda x: logo_mapping.get(x, ""))
+    prognose_raw['DisplayTeam'] = prognose_raw['Team'].apply(translate_team)
+    
+    keep_cols = ['Platz', 'Wappen', 'DisplayTeam', 'AvgPoints']
+    keep_cols += ['Titel', 'Finale', 'Halbfinale', 'Viertelfinale', 'Achtelfinale', 'Top8', 'Playoff', 'Out'] if is_cl else ['Meister', 'CL', 'EL', 'ConfL', 'Abstieg']
+    return prognose_raw[keep_cols]
+
+# --- WAS-WÄRE-WENN (AUF DER LETZTEN SIMULATION DER LIGA) ---
+def scenario_fixtures(league_name, matches, limit):
+    """Die nächsten offenen Spiele, die in der gespeicherten Simulation stecken, als (Anstoß, Heim, Gast)."""
+    state = get_result_cache().get(resultcache.state_key(league_name))
+    if state is None or matches is None: return []
+    simulated = set(state['fixture_keys'].tolist())
+    open_rows = np.flatnonzero(~matches.finished & matches.valid)
+    open_rows = open_rows[np.argsort(matches.dates[open_rows], kind='stable')]
+    fixtures = []
+    for row in open_rows:
+        home, away = matches.teams[matches.home[row]], matches.teams[matches.away[row]]
+        if simulation.stable_key(home, away) in simulated:
+            fixtures.append((pd.Timestamp(matches.dates[row]).tz_localize('UTC'), home, away))
+        if len(fixtures) >= limit: break
+    return fixtures
+
+def run_scenario(league_name, forced, logo_mapping):
+    """Wertet ein Szenario ({(Heim, Gast): '1'/'X'/'2'}) aus; None, solange für die Liga noch keine Simulation vorliegt."""
+    state = get_result_cache().get(resultcache.state_key(league_name))
+    if state is None: return None
+    with metrics.span('scenario'):
+        scenario = run_on_pool(simulation.evaluate_scenario, state, forced)
+    return format_prognose(scenario, logo_mapping, state['model']['is_cl']), dict(scenario.attrs)
+
+# --- PROZESS-POOL FÜR SIMULATIONS-SHARDS (GETEILT VON ALLEN LIGEN) ---
+@st.cache_resource
+def get_process_pool():
+    # spawn statt fork: der Pool wird aus Threads des Schedulers heraus benutzt
+    return ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+
+def run_on_pool(func, *args, **kwargs):
+    """
+    Ruft func(..., executor=Prozess-Pool) auf. Ist der Pool kaputt (z.B. Worker vom OOM-Killer beendet),
+    wird er verworfen und einmal mit einem neuen Pool wiederholt, danach im eigenen Prozess gerechnet.
+    """
+    for _ in range(2):
+        pool = get_process_pool()
+        try:
+            return func(*args, executor=pool, **kwargs)
+        except BrokenProcessPool as e:
+            metrics.incr('process_pool_broken')
+            print(f"Prozess-Pool defekt, wird neu gestartet: {e}")
+            if get_process_pool() is pool: get_process_pool.clear() # Nicht den schon ersetzten Pool eines anderen Threads verwerfen
+            pool.shutdown(wait=False)
+    return func(*args, executor=None, **kwargs)
+
+# --- ERGEBNIS-CACHE (EINMAL PRO PROZESS) ---
+@st.cache_resource
+def get_result_cache():
+    return resultcache.ResultCache()
+
+# --- HINTERGRUND-SCHEDULER (EINMAL PRO PROZESS) ---
+@st.cache_resource
+def get_scheduler():
+    return scheduler.LeagueScheduler(compute_league, LEAGUES.keys(), is_hot=lambda r: r.get("hot", False),
+                                     is_live=lambda r: r.get("live", False)).start()
+
+def fetch_and_simulate_league(league_name, timeout=120):
+    """Liest das zuletzt berechnete Ergebnis. Nur direkt nach dem Start wird auf den ersten Lauf gewartet."""
+    result = get_scheduler().get(league_name, timeout=timeout)
+    return result if result is not None else empty_result()
+
+def refresh_breakdown(league_name):
+    """Letzte Refreshs einer Liga als Tabelle (Sekunden pro Phase) für das Admin-Panel."""
+    rows = []
+    for trace in reversed(metrics.recent_refreshes(league_name)):
+        row = {'Zeit': datetime.fromtimestamp(trace['started']).strftime("%d.%m. %H:%M:%S"), 'Gesamt': trace['total']}
+        row.update(trace['stages'])
+        if trace['error']: row['Fehler'] = trace['error']
+        rows.append(row)
+    return pd.DataFrame(rows)
+
 def is_league_cached_safe(league_name):
-    """Prüft, ob die Funktion für die gegebene Liga bereits im Cache liegt."""
-    try:
-        # Dies ist der interne, private Weg, der stabiler sein sollte
-        # Wir müssen den Hash manuell erstellen, da wir keine öffentliche API haben
-        cache_entry = fetch_and_simulate_league._cache.get(league_name)
-        return cache_entry is not None
-    except:
-        # Fallback falls interne Struktur nicht existiert
-        return False
+    """Prüft, ob für die Liga bereits ein fertiges Ergebnis vorliegt."""
+    return get_scheduler().has_result(league_name) # Unabhängig vom Ergebnis-Cache, der verdrängen darf
 
 # --- INFO HEADER (GLOBAL) ---
-st.info("ℹ️ **Hinweis:** Die Daten werden täglich aktualisiert. Die Simulationsergebnisse können nach jeder aktualisierung leicht variieren.", icon="🎲")
+st.info("ℹ️ **Hinweis:** Die Daten werden täglich aktualisiert. Die Simulationsergebnisse ändern sich nur, wenn neue Spielergebnisse vorliegen.", icon="🎲")
 
 # --- SIDEBAR ---
 with st.sidebar:
@@ -227,13 +362,30 @@ with st.sidebar:
             st.write("---")
             for league in LEAGUES.keys():
                 if st.button(f"🔄 Update {league}"):
-                    # LÖSCHT DEN GLOBALEN CACHE FÜR DIESE LIGA
-                    fetch_and_simulate_league.clear_cache(league)
-                    st.toast(f"{league} wird neu geladen!", icon="✅")
+                    # Sofortiger Refresh im Hintergrund, alte Daten bleiben bis dahin sichtbar
+                    get_scheduler().refresh(league)
+                    st.toast(f"{league} wird im Hintergrund neu geladen!", icon="✅")
                     st.rerun() 
-            if st.button("🔴 Cache komplett leeren"):
-                fetch_and_simulate_league.clear()
+            if st.button("🔴 Alle Ligen neu laden"):
+                get_scheduler().refresh()
                 st.rerun()
+            st.write("---")
+            st.caption("⏱️ Letzte Refreshs (Sekunden pro Phase)")
+            metrics_league = st.selectbox("Liga", list(LEAGUES.keys()), key="metrics_league")
+            breakdown = refresh_breakdown(metrics_league)
+            if not breakdown.empty:
+                st.dataframe(breakdown.style.format("{:.2f}", subset=breakdown.select_dtypes('number').columns), hide_index=True)
+            else:
+                st.info("Noch kein Refresh protokolliert.")
+            cache_stats = get_result_cache().stats()
+            st.caption(f"🗄️ Ergebnis-Cache: {cache_stats['entries']} Einträge, "
+                       f"{cache_stats['bytes'] / 2**20:.1f} / {cache_stats['max_bytes'] / 2**20:.0f} MB, "
+                       f"{cache_stats['hits']} Treffer, {cache_stats['evictions']} verdrängt")
+            api_status = data.api_status()
+            circuit = {'closed': "geschlossen", 'open': "offen", 'half_open': "halb offen"}[api_status['circuit']]
+            st.caption(f"🔌 API: Circuit Breaker {circuit}, {api_status['consecutive_failures']} Fehler in Folge, "
+                       f"{max(api_status['tokens'], 0):.1f} Requests frei")
+            st.download_button("📥 Metriken exportieren", metrics.export_json(), file_name="metrics.json", mime="application/json")
 
 # --- VIEW: DASHBOARD ---
 def show_dashboard():
@@ -249,10 +401,10 @@ def show_dashboard():
                 if st.session_state.is_admin:
                     with c_head2:
                         if st.button("🔄", key=f"dash_rl_{league_name}", help="Admin: Neu laden"):
-                            fetch_and_simulate_league.clear_cache(league_name)
+                            get_scheduler().refresh(league_name)
                             st.rerun()
 
-                # Daten holzen (Cache wird genutzt!)
+                # Daten holen (im Hintergrund vorberechnet)
                 data = fetch_and_simulate_league(league_name)
                 
                 if data and data.get('leader') != "-":
@@ -293,11 +445,12 @@ def show_league_detail(league_name):
         
     if st.session_state.is_admin:
         if st.button("🔄 Admin: Daten aktualisieren"):
-            fetch_and_simulate_league.clear_cache(league_name)
+            get_scheduler().refresh(league_name)
             st.rerun()
 
     tabs = ["🏆 Tabelle & Prognose", "🎲 Kicktipp-Helfer", "👟 Torschützen"]
     if league_name == "Champions League": tabs.append("🏆 K.O.-Baum")
+    tabs.append("🔮 Was wäre wenn")
     active_tabs = st.tabs(tabs)
 
     # TAB 1
@@ -306,8 +459,11 @@ def show_league_detail(league_name):
             c1, c2 = st.columns([1.5, 1])
             with c1:
                 st.subheader("Saison-Ende Prognose")
+                precision = data.get('precision') or {}
+                if precision.get('n_simulations'):
+                    st.caption(f"{precision['n_simulations']:,} Simulationen · Genauigkeit ±{precision['std_error']:.2f} %-Punkte (Standardfehler)".replace(",", "."))
                 is_cl = (league_name == "Champions League")
-                subset = ['Titel', 'Top8', 'Playoff', 'Out'] if is_cl else ['Meister', 'CL', 'Abstieg']
+                subset = ['Titel', 'Finale', 'Halbfinale', 'Viertelfinale', 'Achtelfinale', 'Top8', 'Playoff', 'Out'] if is_cl else ['Meister', 'CL', 'Abstieg']
                 if 'EL' in data['prognose'].columns and not is_cl: subset.append('EL')
                 
                 styler = data['prognose'].style.format("{:.1f}%", subset=subset).format("{:.0f}", subset=['AvgPoints']) \
@@ -331,7 +487,7 @@ def show_league_detail(league_name):
             def highlight_max(s):
                 is_max = s == s.max(); return ['background-color: #d4edda; color: green' if v else '' for v in is_max]
             k_height = (len(data['kicktipp']) + 1) * 35 + 3
-            st.dataframe(data['kicktipp'].style.format("{:.1f}%", subset=['1', 'X', '2']).apply(highlight_max, axis=1, subset=['1', 'X', '2']),
+            st.dataframe(data['kicktipp'].style.format("{:.1f}%", subset=['1', 'X', '2', 'Über 2.5', 'Beide treffen']).apply(highlight_max, axis=1, subset=['1', 'X', '2']),
                          hide_index=True, use_container_width=False, height=k_height,
                          column_config={"HeimWappen": st.column_config.ImageColumn("", width="small"), "GastWappen": st.column_config.ImageColumn("", width="small")})
         else: st.info("Keine Spiele gefunden.")
@@ -372,6 +528,50 @@ def show_league_detail(league_name):
                                     st.markdown(f"<div style='font-weight: {font}; color: {color};'>{match['Gast']}</div>", unsafe_allow_html=True)
             else: st.warning("K.O.-Baum konnte noch nicht simuliert werden.")
 
+    with active_tabs[-1]:
+        show_scenario_panel(league_name, data)
+
+def show_scenario_panel(league_name, data):
+    st.subheader("🔮 Was wäre wenn?")
+    is_cl = (league_name == "Champions League")
+    fixtures = scenario_fixtures(league_name, data.get('matches'), 18 if is_cl else 10)
+    if not fixtures or data['prognose'].empty:
+        st.info("Keine offenen Spiele für Szenarien (oder die Simulation läuft noch)."); return
+
+    st.caption("Ergebnisse festlegen – der Rest der Saison bleibt simuliert, ohne neuen Simulationslauf.")
+    choices = {"–": None, "Heimsieg": "1", "Remis": "X", "Auswärtssieg": "2"}
+    forced = {}
+    for kickoff, home, away in fixtures:
+        c1, c2 = st.columns([3, 2])
+        with c1: st.markdown(f"{kickoff:%d.%m. %H:%M} · **{translate_team(home)}** – **{translate_team(away)}**")
+        with c2: choice = st.selectbox(f"{home} - {away}", list(choices), key=f"whatif_{league_name}_{home}_{away}", label_visibility="collapsed")
+        if choices[choice]: forced[(home, away)] = choices[choice]
+    if not forced: return
+
+    logo_mapping = dict(zip(data['table']['OriginalName'], data['table']['Wappen'])) if not data['table'].empty else {}
+    try:
+        outcome = run_scenario(league_name, forced, logo_mapping)
+    except ValueError as e:
+        st.warning(f"Szenario nicht möglich: {e}"); return
+    if outcome is None:
+        st.info("Simulation läuft noch."); return
+
+    scenario, attrs = outcome
+    method = "gefiltert" if attrs['scenario_method'] == 'filter' else "neu gewürfelt"
+    st.caption(f"{attrs['n_simulations']:,.0f} Simulationen ({method}, {attrs['scenario_share']:.0%} erfüllten das Szenario schon) · "
+               f"Genauigkeit ±{attrs['std_error']:.2f} %-Punkte".replace(",", "."))
+    subset = ['Titel', 'Finale', 'Halbfinale', 'Top8', 'Out'] if is_cl else ['Meister', 'CL', 'EL', 'Abstieg']
+    base = data['prognose'].set_index('DisplayTeam')
+    deltas = []
+    for col in subset[:2]:
+        scenario[f"Δ {col}"] = scenario[col] - scenario['DisplayTeam'].map(base[col])
+        deltas.append(f"Δ {col}")
+    styler = scenario[['Platz', 'Wappen', 'DisplayTeam', 'AvgPoints'] + subset + deltas].style \
+        .format("{:.1f}%", subset=subset).format("{:+.1f}", subset=deltas).format("{:.0f}", subset=['AvgPoints']) \
+        .background_gradient(cmap='RdYlGn', subset=deltas, vmin=-20, vmax=20)
+    st.dataframe(styler, hide_index=True, use_container_width=True, height=(len(scenario) + 1) * 35 + 3,
+                 column_config={"Wappen": st.column_config.ImageColumn("", width="small"), "DisplayTeam": "Verein", "AvgPoints": "Ø Pkt"})
+
 # --- LEGAL PAGES ---
 def show_legal_page(page_type):
     if st.button("⬅️ Zurück zur Startseite"):
@@ -0,0 +1,224 @@
+"""
+Benchmark-Harness für simulation.py und data.py (ohne Netzwerk).
+
+Erzeugt synthetische Spielpläne im Format von data.fetch_matches_external,
+misst Laufzeit und Speicher-Peak pro Funktion und vergleicht mit gespeicherten Baselines.
+
+    python benchmark.py                  # messen & mit Baseline vergleichen (Exit-Code 1 bei Regression)
+    python benchmark.py --save-baseline  # aktuelle Messung als neue Baseline speichern
+
+Baselines sind maschinenabhängig: nach einem Hardware-Wechsel neu speichern.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import data
+import simulation
+import tiebreakers
+from matchstore import MatchStore
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+REGRESSION_TOLERANCE = 1.5 # Langsamer als 1.5x Baseline gilt als Regression
+
+# --- SYNTHETISCHE LIGEN ---
+def _round_robin_rounds(n_teams):
+    """Spieltage einer Einfachrunde nach der Kreismethode (Listen von (Heim, Gast) Index-Paaren)."""
+    order = list(range(n_teams))
+    rounds = []
+    for r in range(n_teams - 1):
+        pairs = []
+        for i in range(n_teams // 2):
+            t1, t2 = order[i], order[n_teams - 1 - i]
+            pairs.append((t1, t2) if (r + i) % 2 == 0 else (t2, t1))
+        rounds.append(pairs)
+        order = [order[0], order[-1]] + order[1:-1]
+    return rounds
+
+def synthetic_league(n_teams=18, completion=0.5, cl_league_phase=False, seed=0, start="2024-08-23"):
+    """
+    Spielplan als DataFrame (Date, HomeTeam, AwayTeam, HomeGoals, AwayGoals, Finished, Stage).
+    Liga: Hin- und Rückrunde. CL: 36 Teams, 8 Spieltage Ligaphase.
+    completion = Anteil bereits gespielter Spieltage.
+    """
+    rng = np.random.default_rng(seed)
+    teams = [f"Team {i + 1:02d}" for i in range(n_teams)]
+    strength = rng.lognormal(0.0, 0.25, size=n_teams)
+
+    first_half = _round_robin_rounds(n_teams)
+    if cl_league_phase:
+        # 8 Spieltage, Heimrecht möglichst ausgeglichen (ca. 4 Heim- und 4 Auswärtsspiele pro Team)
+        home_games = np.zeros(n_teams, dtype=int)
+        matchdays = []
+        for pairs in first_half[:8]:
+            md = []
+            for h, a in pairs:
+                if home_games[h] > home_games[a]: h, a = a, h
+                home_games[h] += 1
+                md.append((h, a))
+            matchdays.append(md)
+        stage = "LEAGUE_STAGE"
+    else:
+        matchdays = first_half + [[(a, h) for h, a in md] for md in first_half]
+        stage = "REGULAR_SEASON"
+
+    n_played = int(round(len(matchdays) * completion))
+    rows = []
+    for md, pairs in enumerate(matchdays):
+        date = pd.Timestamp(start, tz="UTC") + pd.Timedelta(days=7 * md, hours=18)
+        finished = md < n_played
+        for h, a in pairs:
+            hg = rng.poisson(1.45 * strength[h] / strength[a]) if finished else 0
+            ag = rng.poisson(1.15 * strength[a] / strength[h]) if finished else 0
+            rows.append({'Date': date, 'HomeTeam': teams[h], 'AwayTeam': teams[a],
+                         'HomeGoals': int(hg), 'AwayGoals': int(ag), 'Finished': finished, 'Stage': stage})
+    return pd.DataFrame(rows)
+
+def live_snapshot(frame, minute=60, seed=0):
+    """Nächster Spieltag läuft gerade (Minute minute, Stand passend zur bisherigen Spielzeit gewürfelt)."""
+    rng = np.random.default_rng(seed)
+    frame = frame.copy()
+    frame['Minute'] = -1
+    upcoming = ~frame['Finished']
+    if not upcoming.any(): return frame
+    live = upcoming & (frame['Date'] == frame.loc[upcoming, 'Date'].min())
+    frame.loc[live, 'Minute'] = minute
+    frame.loc[live, 'HomeGoals'] = rng.poisson(1.45 * minute / 90, live.sum())
+    frame.loc[live, 'AwayGoals'] = rng.poisson(1.15 * minute / 90, live.sum())
+    return frame
+
+def synthetic_payload(frame):
+    """Spielplan als JSON-Text im Format der API-Antwort (inkl. Area, Schiedsrichter, Quoten, Halbzeitstand)."""
+    team = lambda name: {'id': int(name[-2:]), 'name': name, 'shortName': name, 'tla': f"T{name[-2:]}",
+                         'crest': f"https://crests.football-data.org/{name[-2:]}.png"}
+    matches = []
+    for i, row in enumerate(frame.itertuples(index=False)):
+        goals = lambda g: int(g) if row.Finished else None
+        matches.append({
+            'area': {'id': 2088, 'name': 'Germany', 'code': 'DEU', 'flag': 'https://crests.football-data.org/759.svg'},
+            'competition': {'id': 2002, 'name': 'Bundesliga', 'code': 'BL1', 'type': 'LEAGUE', 'emblem': None},
+            'season': {'id': 2290, 'startDate': '2024-08-23', 'endDate': '2025-05-17', 'currentMatchday': 1, 'winner': None},
+            'id': 500000 + i, 'utcDate': row.Date.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            'status': 'FINISHED' if row.Finished else 'TIMED', 'matchday': 1, 'stage': row.Stage, 'group': None,
+            'lastUpdated': '2025-05-18T00:20:00Z', 'homeTeam': team(row.HomeTeam), 'awayTeam': team(row.AwayTeam),
+            'score': {'winner': None, 'duration': 'REGULAR', 'fullTime': {'home': goals(row.HomeGoals), 'away': goals(row.AwayGoals)},
+                      'halfTime': {'home': goals(row.HomeGoals // 2), 'away': goals(row.AwayGoals // 2)}},
+            'odds': {'msg': 'Activate Odds-Package in User-Panel to retrieve odds.'},
+            'referees': [{'id': 1, 'name': 'Referee', 'type': 'REFEREE', 'nationality': 'Germany'}],
+        })
+    return json.dumps({'filters': {}, 'resultSet': {'count': len(matches)}, 'matches': matches})
+
+SCENARIOS = {
+    "bundesliga_50": dict(n_teams=18, completion=0.5),
+    "premier_league_20": dict(n_teams=20, completion=0.2),
+    "premier_league_90": dict(n_teams=20, completion=0.9),
+    "la_liga_50_h2h": dict(n_teams=20, completion=0.5, tiebreak="head_to_head"),
+    "cl_league_phase_50": dict(n_teams=36, completion=0.5, cl_league_phase=True),
+}
+
+# --- MESSUNG ---
+def measure(func, repeat=3):
+    """Beste Laufzeit aus repeat Läufen (s) und Speicher-Peak (MiB) eines Laufs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_mib": peak / 2**20}
+
+def _uncached(func, *args, **kwargs):
+    """Misst ohne die Modell-Caches (Fit und Ergebnistabellen werden pro Match-Stand gemerkt)."""
+    simulation._STRENGTH_CACHE.clear()
+    simulation._SCORE_TABLE_CACHE.clear()
+    return func(*args, **kwargs)
+
+def run_benchmarks(sim_counts=(1000, 10000, 50000), repeat=3):
+    results = {}
+    for name, params in SCENARIOS.items():
+        params = dict(params)
+        tiebreak = params.pop("tiebreak", None)
+        frame = synthetic_league(**params)
+        matches = MatchStore.from_frame(frame) # Wie in der App: Hot-Paths laufen auf dem MatchStore
+        is_cl = params.get("cl_league_phase", False)
+        tiebreak = tiebreak or ("uefa" if is_cl else tiebreakers.DEFAULT_TIEBREAK)
+        table = data.calculate_current_table(matches, tiebreak)
+
+        payload = synthetic_payload(frame)
+
+        cases = {
+            "parse_matches_payload[json.loads]": lambda: data.parse_matches_payload(json.loads(payload)),
+            "parse_matches_payload[stream]": lambda: data.parse_matches_payload(payload),
+            "match_store_from_frame": lambda: MatchStore.from_frame(frame),
+            "calculate_smart_strengths": lambda: _uncached(simulation.calculate_smart_strengths, matches),
+            "calculate_current_table": lambda: data.calculate_current_table(matches, tiebreak),
+            "predict_upcoming_matches": lambda: _uncached(simulation.predict_upcoming_matches, matches, next_n=None),
+        }
+        for n in sim_counts:
+            cases[f"simulate_season[{n}]"] = lambda n=n: simulation.simulate_season(matches, table, n_simulations=n, is_cl=is_cl, seed=0,
+                                                                                    tiebreak=tiebreak)
+        # Live-Update: Zustand der letzten Simulation liegt vor, nur die laufenden Spiele ändern sich
+        live = MatchStore.from_frame(live_snapshot(frame))
+        _, state = simulation.simulate_season_incremental(matches, table, is_cl=is_cl, seed=0, tiebreak=tiebreak)
+        cases["simulate_season_incremental[live]"] = lambda state=state, live=live: simulation.simulate_season_incremental(
+            live, table, state, is_cl=is_cl, seed=0, tiebreak=tiebreak)
+        # Was-wäre-wenn: Heimsieg im nächsten Spiel, ausgewertet auf der gespeicherten Simulation
+        teams, first = state['model']['teams'], (state['model']['home_idx'][0], state['model']['away_idx'][0])
+        forced = {(teams[first[0]], teams[first[1]]): '1'}
+        cases["evaluate_scenario"] = lambda state=state, forced=forced: simulation.evaluate_scenario(state, forced)
+        if is_cl:
+            cases["generate_cl_bracket"] = lambda: simulation.generate_cl_bracket(matches, table, rng=0)
+
+        for case, func in cases.items():
+            results[f"{name}/{case}"] = measure(func, repeat=repeat)
+    return results
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Liste der Regressionen (Key, Baseline-Sekunden, aktuelle Sekunden)."""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if base and current["seconds"] > base["seconds"] * tolerance:
+            regressions.append((key, base["seconds"], current["seconds"]))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks für simulation.py und data.py")
+    parser.add_argument("--save-baseline", action="store_true", help="Messung als neue Baseline speichern")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sims", type=int, nargs="+", default=[1000, 10000, 50000], help="Simulationsanzahlen für simulate_season")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(sim_counts=args.sims, repeat=args.repeat)
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f: baseline = json.load(f)
+
+    print(f"{'Benchmark':<62} {'Zeit (ms)':>10} {'Baseline':>10} {'Peak MiB':>9}")
+    for key, res in results.items():
+        base = baseline.get(key, {}).get("seconds")
+        base_str = f"{base*1000:10.1f}" if base else f"{'-':>10}"
+        print(f"{key:<62} {res['seconds']*1000:10.1f} {base_str} {res['peak_mib']:9.1f}")
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as f: json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline gespeichert: {BASELINE_PATH}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for key, base, current in regressions:
+        print(f"REGRESSION {key}: {base*1000:.1f} ms -> {current*1000:.1f} ms")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
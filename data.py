@@ -1,41 +1,434 @@
 import requests
 import pandas as pd
+import numpy as np
 import streamlit as st
 import time
+import threading
+import os
+import random
+import json
+import re
+import sqlite3
+from contextlib import closing
+from json.decoder import scanstring
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+import tiebreakers
+from matchstore import MatchStore, as_match_store
 
 # Basis-URL Football-Data.org
 FD_BASE_URL = "https://api.football-data.org/v4/competitions"
 
-def make_api_request(url, headers, retries=3):
+# Free-Tier von football-data.org: 10 Requests pro Minute (pro API-Key)
+FD_REQUESTS_PER_MINUTE = 10
+
+class TokenBucket:
+    """Threadsicherer Token-Bucket als globaler Rate-Limiter für alle API-Requests."""
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            with metrics.span('rate_limit_wait'):
+                time.sleep(wait_time)
+
+    def hold(self, seconds):
+        """Nächster Token erst in seconds Sekunden (z.B. nach 429 oder aufgebrauchtem API-Kontingent)."""
+        with self.lock:
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def sync(self, available, reset_seconds=None):
+        """Gleicht mit den Rate-Limit-Headern der API ab: nie mehr Tokens als Requests übrig (auch wenn
+        andere Prozesse mit demselben Key mitzählen), bei 0 übrig erst nach dem Reset wieder."""
+        with self.lock:
+            self.tokens = min(self.tokens, float(available))
+        if available < 1 and reset_seconds: self.hold(reset_seconds)
+
+RATE_LIMITER = TokenBucket(FD_REQUESTS_PER_MINUTE)
+
+# --- FEHLERBEHANDLUNG: BACKOFF & CIRCUIT BREAKER ---
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 8.0        # Obergrenze pro Wartezeit zwischen zwei Versuchen
+CIRCUIT_FAILURES = 3             # Aufeinanderfolgende Fehlschläge (Timeout, 5xx), bis der Breaker öffnet
+CIRCUIT_COOLDOWN_SECONDS = 60    # So lange gehen keine Requests raus, danach ein einzelner Probe-Request
+
+class CircuitBreaker:
+    """
+    Schützt vor einer ausgefallenen API: nach failures Fehlschlägen in Folge ist der Breaker offen
+    und Requests scheitern sofort (Aufrufer liefern die letzten guten Daten aus dem Payload-Cache).
+    Nach cooldown darf ein einzelner Probe-Request durch (halb offen), Erfolg schließt wieder.
+    """
+    def __init__(self, failures=CIRCUIT_FAILURES, cooldown=CIRCUIT_COOLDOWN_SECONDS):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive = 0
+        self.opened = None   # time.monotonic() beim Öffnen, None = geschlossen
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened is None: return 'closed'
+            return 'half_open' if time.monotonic() - self.opened >= self.cooldown else 'open'
+
+    def allow(self):
+        with self.lock:
+            if self.opened is None: return True
+            if self.probing or time.monotonic() - self.opened < self.cooldown: return False
+            self.probing = True
+            return True
+
+    def release(self):
+        """Gibt einen Probe-Request frei, der ohne Ergebnis (record) abgebrochen wurde."""
+        with self.lock:
+            self.probing = False
+
+    def record(self, success):
+        with self.lock:
+            self.probing = False
+            if success:
+                self.consecutive, self.opened = 0, None
+                return
+            self.consecutive += 1
+            if self.opened is not None or self.consecutive >= self.failures:
+                if self.opened is None: metrics.incr('api_circuit_opened')
+                self.opened = time.monotonic() # Gescheiterter Probe-Request: Cooldown von vorn
+
+CIRCUIT_BREAKER = CircuitBreaker()
+
+def _header_number(value):
+    try: return max(float(value), 0.0)
+    except (TypeError, ValueError): return None
+
+def retry_after_seconds(value):
+    """Retry-After als Sekunden (Header enthält Sekunden oder ein HTTP-Datum), None wenn nicht gesetzt."""
+    seconds = _header_number(value)
+    if seconds is not None or not value: return seconds
+    try: return max((parsedate_to_datetime(value) - pd.Timestamp.now(tz="UTC")).total_seconds(), 0.0)
+    except (TypeError, ValueError): return None
+
+def backoff_seconds(attempt, retry_after=None):
+    """Wartezeit vor Versuch attempt + 1: Vorgabe der API (plus etwas Jitter) oder exponentiell mit Jitter."""
+    if retry_after is not None: return retry_after + random.uniform(0, BACKOFF_BASE_SECONDS)
+    return random.uniform(0.5, 1.0) * min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)
+
+def api_status():
+    """Zustand von Circuit Breaker und Rate-Limiter (für das Admin-Panel)."""
+    with RATE_LIMITER.lock:
+        tokens = RATE_LIMITER.tokens
+    return {'circuit': CIRCUIT_BREAKER.state, 'consecutive_failures': CIRCUIT_BREAKER.consecutive, 'tokens': tokens}
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+def get_session():
+    """Geteilte requests-Session mit Connection-Pool (Keep-Alive über alle Threads)."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            _SESSION.mount("https://", adapter)
+            _SESSION.mount("http://", adapter)
+    return _SESSION
+
+# --- PERSISTENTER PAYLOAD-CACHE (SQLite) ---
+PAYLOAD_CACHE_PATH = os.environ.get("FUSSBALL_CACHE_PATH", os.path.join(".cache", "api_payloads.sqlite"))
+PAYLOAD_FRESH_SECONDS = 60         # Innerhalb dieses Fensters kein Request
+PAYLOAD_STALE_SECONDS = 15 * 60    # Bis hierhin: alte Daten sofort liefern, im Hintergrund revalidieren
+PAYLOAD_REFUSED_SECONDS = 24 * 60 * 60 # Von der API verweigerte abgeschlossene Saison (4xx, z.B. Free-Tier) erst morgen wieder anfragen
+
+class PayloadCache:
+    """
+    Speichert rohe API-Antworten (JSON-Text) samt ETag/Last-Modified auf der Platte,
+    damit Neustarts und Cache-Leerungen nicht die komplette Saison neu laden.
+    Absagen der API (refusals) werden ebenfalls gespeichert, damit ein Neustart sie nicht erneut anfragt.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS payloads (
+                key TEXT PRIMARY KEY, body TEXT NOT NULL, etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL)""")
+            conn.execute("CREATE TABLE IF NOT EXISTS refusals (key TEXT PRIMARY KEY, refused_at REAL NOT NULL)")
+
+    def _connect(self):
+        # Autocommit: jede Anweisung steht für sich, closing() schließt die Verbindung danach wieder
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def get(self, key):
+        with self.lock, closing(self._connect()) as conn:
+            row = conn.execute("SELECT body, etag, last_modified, fetched_at FROM payloads WHERE key = ?", (key,)).fetchone()
+        if row is None: return None
+        return {'body': row[0], 'etag': row[1], 'last_modified': row[2], 'fetched_at': row[3]}
+
+    def put(self, key, body, etag=None, last_modified=None):
+        with self.lock, closing(self._connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO payloads VALUES (?, ?, ?, ?, ?)", (key, body, etag, last_modified, time.time()))
+
+    def touch(self, key):
+        """Nach 304 Not Modified: Eintrag gilt wieder als frisch."""
+        with self.lock, closing(self._connect()) as conn:
+            conn.execute("UPDATE payloads SET fetched_at = ? WHERE key = ?", (time.time(), key))
+
+    def delete(self, key):
+        with self.lock, closing(self._connect()) as conn:
+            conn.execute("DELETE FROM payloads WHERE key = ?", (key,))
+
+    def refuse(self, key):
+        """Negativ-Eintrag: die API hat key endgültig abgelehnt (4xx)."""
+        with self.lock, closing(self._connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO refusals VALUES (?, ?)", (key, time.time()))
+
+    def is_refused(self, key, max_age=PAYLOAD_REFUSED_SECONDS):
+        """Hat die API key in den letzten max_age Sekunden abgelehnt?"""
+        with self.lock, closing(self._connect()) as conn:
+            row = conn.execute("SELECT refused_at FROM refusals WHERE key = ?", (key,)).fetchone()
+        return row is not None and time.time() - row[0] < max_age
+
+_PAYLOAD_CACHE = None
+
+def get_payload_cache():
+    global _PAYLOAD_CACHE
+    with _SESSION_LOCK:
+        if _PAYLOAD_CACHE is None:
+            _PAYLOAD_CACHE = PayloadCache(PAYLOAD_CACHE_PATH)
+    return _PAYLOAD_CACHE
+
+def payload_key(competition_id, endpoint, season_year=None):
+    return f"{competition_id}/{endpoint}/{season_year or 'current'}"
+
+def _fetch_from_api(url, headers, retries=3, cached=None):
+    """
+    Eigentlicher HTTP-Request. Mit cached wird konditional angefragt (If-None-Match/If-Modified-Since).
+    Liefert (status, body_text, response_headers), bei einer Absage (4xx außer 429) (status, None, headers),
+    sonst (None, None, None).
+    429 und vorübergehende Fehler (Timeout, 5xx) werden mit Jitter wiederholt, Retry-After bzw. das
+    verbleibende Kontingent bremsen den globalen Rate-Limiter. Liegen alte Daten vor (cached), wird nicht
+    gewartet, sondern sofort aufgegeben: der Aufrufer liefert dann die alten Daten.
+    """
+    headers = dict(headers)
+    if cached:
+        if cached['etag']: headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']: headers['If-Modified-Since'] = cached['last_modified']
     for i in range(retries):
+        if not CIRCUIT_BREAKER.allow():
+            metrics.incr('api_circuit_rejected')
+            return None, None, None
+        retry_after, rate_limited = None, False
         try:
-            response = requests.get(url, headers=headers, timeout=15)
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 429:
-                wait_time = 2 ** (i + 1)
-                time.sleep(wait_time)
-                continue
+            RATE_LIMITER.acquire()
+            metrics.incr('api_calls')
+            with metrics.span('http'):
+                response = get_session().get(url, headers=headers, timeout=15)
+        except requests.RequestException:
+            metrics.incr('api_errors')
+            CIRCUIT_BREAKER.record(False)
+        else:
+            available = _header_number(response.headers.get('X-Requests-Available-Minute'))
+            reset = _header_number(response.headers.get('X-RequestCounter-Reset'))
+            if available is not None: RATE_LIMITER.sync(available, reset)
+            if response.status_code in (200, 304):
+                CIRCUIT_BREAKER.record(True)
+                return response.status_code, response.text, response.headers
+            if response.status_code == 429:
+                metrics.incr('api_retries_429')
+                rate_limited = True
+                CIRCUIT_BREAKER.record(True) # API antwortet, nur das Kontingent ist erschöpft
+                retry_after = retry_after_seconds(response.headers.get('Retry-After'))
+                RATE_LIMITER.hold(backoff_seconds(i, retry_after if retry_after is not None else reset))
+            elif response.status_code >= 500:
+                metrics.incr('api_errors')
+                CIRCUIT_BREAKER.record(False)
+                retry_after = retry_after_seconds(response.headers.get('Retry-After'))
             else:
-                return None
-        except:
-            return None
+                # 4xx (z.B. Saison nicht im Free-Tier): kein API-Ausfall, Wiederholen bringt nichts
+                metrics.incr('api_errors')
+                CIRCUIT_BREAKER.record(True)
+                return response.status_code, None, response.headers
+        finally:
+            CIRCUIT_BREAKER.release() # Auch bei unerwarteten Fehlern den Probe-Request nicht blockiert lassen
+        if cached or i == retries - 1: return None, None, None
+        metrics.incr('api_retries')
+        if rate_limited: continue # Wartet im nächsten acquire() auf den gebremsten Rate-Limiter
+        if retry_after is not None and retry_after > BACKOFF_MAX_SECONDS: return None, None, None
+        with metrics.span('backoff'):
+            time.sleep(backoff_seconds(i, retry_after))
+    return None, None, None
+
+PAYLOAD_PARSE_ERRORS = (ValueError, TypeError, AttributeError) # Kein JSON (z.B. HTML-Wartungsseite) oder unerwartete Struktur
+
+def _try_parse(parse, body):
+    """(parse(body), True) oder (None, False), wenn sich die Antwort nicht parsen lässt."""
+    try:
+        with metrics.span('parse'):
+            return parse(body), True
+    except PAYLOAD_PARSE_ERRORS as e:
+        metrics.incr('payload_parse_errors')
+        print(f"Fehler beim Parsen der API-Antwort: {e}")
+        return None, False
+
+def _revalidate(url, headers, cache_key, cached, retries=3, immutable=False, parse=json.loads):
+    """Konditionaler Request; liefert (geparster Wert, ok). Gespeichert wird nur, was sich parsen lässt."""
+    status, body, resp_headers = _fetch_from_api(url, headers, retries, cached)
+    cache = get_payload_cache()
+    if status == 304:
+        metrics.incr('api_not_modified')
+        value, ok = _try_parse(parse, cached['body'])
+        if ok: cache.touch(cache_key)
+        return value, ok
+    if status == 200:
+        value, ok = _try_parse(parse, body)
+        if ok: cache.put(cache_key, body, resp_headers.get('ETag'), resp_headers.get('Last-Modified'))
+        return value, ok
+    if status is not None and immutable:
+        cache.refuse(cache_key) # Abgeschlossene Saison abgelehnt: gilt auch nach einem Neustart
+    return None, False
+
+_REVALIDATING = set()
+
+def _revalidate_in_background(url, headers, cache_key, cached, parse=json.loads):
+    with _SESSION_LOCK:
+        if cache_key in _REVALIDATING: return
+        _REVALIDATING.add(cache_key)
+    def run():
+        try: _revalidate(url, headers, cache_key, cached, parse=parse)
+        finally:
+            with _SESSION_LOCK: _REVALIDATING.discard(cache_key)
+    threading.Thread(target=run, daemon=True).start()
+
+def make_api_request(url, headers, retries=3, cache_key=None, immutable=False, revalidate=False, parse=json.loads,
+                     cached_only=False, fresh_seconds=None):
+    """
+    GET mit optionalem Platten-Cache (cache_key gesetzt):
+    frisch -> aus dem Cache, leicht veraltet -> Cache sofort + Revalidierung im Hintergrund,
+    älter -> konditionaler Request, bei API-Fehler alte Daten als Fallback.
+    Mit immutable (abgeschlossene Saisons) wird ein vorhandener Eintrag nie wieder angefragt,
+    eine Absage der API erst nach PAYLOAD_REFUSED_SECONDS.
+    Mit revalidate (Refresh des Schedulers) wird ein nicht mehr frischer Eintrag sofort revalidiert statt im
+    Hintergrund, alte Daten gibt es dann nur noch bei einem API-Fehler.
+    parse: wandelt den JSON-Text um (Standard json.loads, für Spielpläne parse_matches_payload).
+    Antworten, die sich nicht parsen lassen, zählen wie ein API-Fehler und landen nie im Cache;
+    ein unbrauchbarer Eintrag (auch immutable) wird gelöscht und neu angefragt.
+    Mit cached_only nur aus dem Cache, ohne Request (None, wenn dort nichts Brauchbares liegt).
+    fresh_seconds: eigenes Frische-Fenster statt PAYLOAD_FRESH_SECONDS (z.B. Torschützen beim Live-Polling).
+    """
+    if cache_key is None:
+        status, body, _ = _fetch_from_api(url, headers, retries)
+        return _try_parse(parse, body)[0] if status == 200 else None
+
+    cache = get_payload_cache()
+    cached = cache.get(cache_key)
+    if cached:
+        age = time.time() - cached['fetched_at']
+        fresh = immutable or age < (PAYLOAD_FRESH_SECONDS if fresh_seconds is None else fresh_seconds)
+        if fresh or (age < PAYLOAD_STALE_SECONDS and not revalidate):
+            value, ok = _try_parse(parse, cached['body'])
+            if ok:
+                if fresh:
+                    metrics.incr('payload_cache_hits')
+                else:
+                    metrics.incr('payload_cache_stale')
+                    _revalidate_in_background(url, headers, cache_key, cached, parse)
+                return value
+            cache.delete(cache_key) # Unbrauchbarer Eintrag: verwerfen und neu anfragen, nicht als Fallback verwenden
+            cached = None
+    if cached_only: return None
+    if immutable and not cached and cache.is_refused(cache_key):
+        metrics.incr('payload_cache_refused')
+        return None
+    metrics.incr('payload_cache_misses')
+
+    value, ok = _revalidate(url, headers, cache_key, cached, retries, immutable, parse)
+    if ok: return value
+    if cached:
+        value, ok = _try_parse(parse, cached['body']) # stale-if-error
+        if ok:
+            metrics.incr('payload_stale_if_error')
+            return value
     return None
 
-def fetch_matches_external(api_key, competition_id, season_year=None):
-    if not api_key: return pd.DataFrame(), {}
-        
-    headers = { 'X-Auth-Token': api_key }
-    url = f"{FD_BASE_URL}/{competition_id}/matches"
-    if season_year: url += f"?season={season_year}"
-    
-    data = make_api_request(url, headers)
-    if not data: return pd.DataFrame(), {}
-        
-    matches = []
+# --- STREAMING-PARSER ---
+_JSON_DECODER = json.JSONDecoder()
+_JSON_WS = re.compile(r'[ \t\n\r]*')
+
+def iter_json_items(body, key):
+    """
+    Elemente des Arrays body[key] (JSON-Text, Top-Level-Objekt) einzeln dekodiert, als Generator.
+    Der komplette Objektbaum entsteht nie: pro Schritt lebt nur ein Element, das der Aufrufer
+    sofort auf seine Felder reduziert; übrige Top-Level-Werte werden nur überlesen.
+    """
+    skip = lambda i: _JSON_WS.match(body, i).end()
+    def expect(i, chars):
+        if i >= len(body) or body[i] not in chars: raise json.JSONDecodeError(f"{chars!r} erwartet", body, i)
+        return body[i], skip(i + 1)
+
+    _, i = expect(skip(0), '{')
+    if body.startswith('}', i): return
+    while True:
+        if not body.startswith('"', i): raise json.JSONDecodeError("Schlüssel erwartet", body, i)
+        name, i = scanstring(body, i + 1)
+        _, i = expect(skip(i), ':')
+        if name == key:
+            _, i = expect(i, '[')
+            if body.startswith(']', i): i += 1
+            else:
+                while True:
+                    item, i = _JSON_DECODER.raw_decode(body, i)
+                    yield item
+                    char, i = expect(skip(i), ',]')
+                    if char == ']': break
+        else:
+            _, i = _JSON_DECODER.raw_decode(body, i)
+        char, i = expect(skip(i), ',}')
+        if char == '}': return
+
+LIVE_STATUSES = ('IN_PLAY', 'PAUSED', 'LIVE')
+HALFTIME_MINUTES = 15
+
+def live_minute(match, now):
+    """
+    Spielminute eines laufenden Spiels: aus dem API-Feld 'minute', sonst aus der Zeit seit Anpfiff
+    geschätzt (Halbzeitpause abgezogen, PAUSED = Halbzeit). -1 für nicht laufende Spiele.
+    """
+    status = match.get('status')
+    if status not in LIVE_STATUSES: return -1
+    if match.get('minute') is not None: return min(int(match['minute']), 90)
+    if status == 'PAUSED': return 45
+    elapsed = (now - pd.Timestamp(match.get('utcDate'))).total_seconds() / 60
+    if elapsed > 45 + HALFTIME_MINUTES: elapsed -= HALFTIME_MINUTES
+    elif elapsed > 45: elapsed = 45
+    return int(min(max(elapsed, 0), 90))
+
+def parse_matches_payload(data, now=None):
+    """
+    Baut aus der API-Antwort direkt den spaltenweisen MatchStore (ohne Dict pro Spiel).
+    data: JSON-Text (wird per iter_json_items Spiel für Spiel gestreamt, Schiedsrichter, Quoten usw.
+    fallen sofort weg) oder bereits geparstes Dict.
+    Laufende Spiele behalten ihren aktuellen Stand und bekommen ihre Spielminute (siehe live_minute).
+    """
+    now = now or pd.Timestamp.now(tz="UTC")
+    dates, home_names, away_names, home_goals, away_goals, finished, stages, minutes = [], [], [], [], [], [], [], []
     team_logos = {}
-    
-    for match in data.get('matches', []):
+
+    matches = iter_json_items(data, 'matches') if isinstance(data, str) else data.get('matches', [])
+    for match in matches:
         home = match.get('homeTeam', {})
         away = match.get('awayTeam', {})
         
@@ -48,61 +441,177 @@ def fetch_matches_external(api_key, competition_id, season_year=None):
         if 'crest' in home: team_logos[home['name']] = home['crest']
         if 'crest' in away: team_logos[away['name']] = away['crest']
         
-        is_finished = match.get('status') == 'FINISHED'
-        home_goals = score.get('home')
-        away_goals = score.get('away')
-        
-        matches.append({
-            'Date': match.get('utcDate'),
-            'HomeTeam': home.get('name'),
-            'AwayTeam': away.get('name'),
-            'HomeGoals': int(home_goals) if home_goals is not None else 0,
-            'AwayGoals': int(away_goals) if away_goals is not None else 0,
-            'Finished': is_finished,
-            'Stage': match.get('stage') # Wichtig für CL Filterung
-        })
-        
-    df = pd.DataFrame(matches)
-    if not df.empty:
-        df['Date'] = pd.to_datetime(df['Date'])
-        
-    return df, team_logos
+        hg = score.get('home')
+        ag = score.get('away')
+        dates.append(match.get('utcDate'))
+        home_names.append(home['name'])
+        away_names.append(away['name'])
+        home_goals.append(int(hg) if hg is not None else 0)
+        away_goals.append(int(ag) if ag is not None else 0)
+        finished.append(match.get('status') == 'FINISHED')
+        stages.append(match.get('stage')) # Wichtig für CL Filterung
+        minutes.append(live_minute(match, now))
 
-def calculate_current_table(df):
-    if df.empty: return pd.DataFrame(columns=['Punkte', 'Tore', 'Spiele', 'Diff'])
+    store = MatchStore.from_columns(dates, home_names, away_names, home_goals, away_goals, finished, stages, minutes)
+    return store, team_logos
 
-    teams = {}
-    all_teams = pd.concat([df['HomeTeam'], df['AwayTeam']]).unique()
-    for team in all_teams:
-        teams[team] = {'Punkte': 0, 'Tore': 0, 'Gegentore': 0, 'Spiele': 0}
+def fetch_match_store(api_key, competition_id, season_year=None, revalidate=False):
+    """
+    Wie fetch_matches_external, liefert aber den kompakten MatchStore statt eines DataFrames.
+    revalidate: Payload-Cache nicht im Hintergrund, sondern sofort revalidieren (siehe make_api_request).
+    """
+    if not api_key: return MatchStore.from_frame(pd.DataFrame()), {}
         
-    played = df[df['Finished'] == True]
+    headers = { 'X-Auth-Token': api_key }
+    url = f"{FD_BASE_URL}/{competition_id}/matches"
+    if season_year: url += f"?season={season_year}"
     
-    for _, row in played.iterrows():
-        h = row['HomeTeam']
-        a = row['AwayTeam']
-        hg = row['HomeGoals']
-        ag = row['AwayGoals']
-        
-        teams[h]['Spiele'] += 1; teams[a]['Spiele'] += 1
-        teams[h]['Tore'] += hg; teams[a]['Tore'] += ag
-        teams[h]['Gegentore'] += ag; teams[a]['Gegentore'] += hg
-        
-        if hg > ag: teams[h]['Punkte'] += 3
-        elif ag > hg: teams[a]['Punkte'] += 3
-        else: teams[h]['Punkte'] += 1; teams[a]['Punkte'] += 1
-            
-    table_df = pd.DataFrame.from_dict(teams, orient='index')
+    parsed = make_api_request(url, headers, cache_key=payload_key(competition_id, 'matches', season_year), revalidate=revalidate,
+                              parse=parse_matches_payload)
+    if parsed is None: return MatchStore.from_frame(pd.DataFrame()), {}
+    return parsed
+
+def fetch_matches_external(api_key, competition_id, season_year=None):
+    store, team_logos = fetch_match_store(api_key, competition_id, season_year)
+    return store.to_frame(), team_logos
+
+# --- HISTORIE (VORSAISONS) ---
+HISTORY_SEASONS = 3 # Anzahl Vorsaisons für das Stärkemodell
+
+_HISTORY_STORES = {}    # (competition_id, season_year) -> MatchStore, jede Saison wird nur einmal geparst
+_HISTORY_BACKFILLS = set() # competition_id mit laufendem Hintergrund-Backfill
+_HISTORY_LOCK = threading.Lock()
+
+def season_start_year(matches):
+    """Startjahr der Saison (Saisons beginnen im Sommer: Spiele vor Juli zählen zur Vorjahres-Saison)."""
+    store = as_match_store(matches)
+    if store.empty: return None
+    first = pd.Timestamp(store.dates.min())
+    return first.year if first.month >= 7 else first.year - 1
+
+def fetch_past_season(api_key, competition_id, season_year, cached_only=False):
+    """
+    Beendete Spiele einer abgeschlossenen Saison. Die Antwort landet dauerhaft im Platten-Cache
+    und wird danach nie wieder angefragt; im Speicher wird der geparste Store gehalten.
+    Mit cached_only nur aus Speicher/Platte, ohne Request (None, wenn die Saison dort fehlt).
+    """
+    key = (competition_id, season_year)
+    with _HISTORY_LOCK:
+        if key in _HISTORY_STORES: return _HISTORY_STORES[key]
+    url = f"{FD_BASE_URL}/{competition_id}/matches?season={season_year}"
+    parsed = make_api_request(url, {'X-Auth-Token': api_key}, cache_key=payload_key(competition_id, 'matches', season_year),
+                              immutable=True, parse=parse_matches_payload, cached_only=cached_only)
+    if parsed is None: return None
+    store = parsed[0].subset(parsed[0].finished & parsed[0].valid)
+    with _HISTORY_LOCK:
+        return _HISTORY_STORES.setdefault(key, store)
+
+def fetch_history_store(api_key, competition_id, current_season_year, n_seasons=HISTORY_SEASONS, cached_only=False):
+    """
+    Vorsaisons als ein gemeinsamer MatchStore (nur beendete Spiele).
+    Inkrementell: geladen wird nur, was weder im Speicher noch auf der Platte liegt,
+    nach dem ersten Backfill kostet das keinen API-Request mehr. Mit cached_only nur der lokale Teil.
+    """
+    if not api_key or current_season_year is None: return MatchStore.concat([])
+    years = range(current_season_year - n_seasons, current_season_year)
+    with metrics.span('history'):
+        return MatchStore.concat([fetch_past_season(api_key, competition_id, year, cached_only) for year in years])
+
+def backfill_history_in_background(api_key, competition_id, current_season_year, on_done=None, n_seasons=HISTORY_SEASONS):
+    """
+    Lädt lokal fehlende Vorsaisons in einem eigenen Thread nach, statt den Refresh der Liga darauf warten
+    zu lassen (bis zu 3 Requests pro Liga aus demselben Minuten-Kontingent). on_done() läuft danach,
+    wenn mindestens eine Saison neu dazugekommen ist (z.B. um die Liga mit Historie neu zu rechnen).
+    """
+    if not api_key or current_season_year is None: return
+    years = range(current_season_year - n_seasons, current_season_year)
+    cache = get_payload_cache()
+    with _HISTORY_LOCK:
+        missing = [year for year in years if (competition_id, year) not in _HISTORY_STORES]
+    missing = [year for year in missing if not cache.is_refused(payload_key(competition_id, 'matches', year))]
+    with _HISTORY_LOCK:
+        if not missing or competition_id in _HISTORY_BACKFILLS: return
+        _HISTORY_BACKFILLS.add(competition_id)
+    def run():
+        try:
+            loaded = [fetch_past_season(api_key, competition_id, year) for year in missing]
+        finally:
+            with _HISTORY_LOCK: _HISTORY_BACKFILLS.discard(competition_id)
+        if on_done and any(store is not None for store in loaded): on_done()
+    threading.Thread(target=run, daemon=True, name=f"history-{competition_id}").start()
+
+TABLE_COLUMNS = ['Punkte', 'Tore', 'Gegentore', 'Spiele', 'Siege', 'Auswärtstore', 'Auswärtssiege']
+
+def _finished_results(store):
+    """Beendete Spiele (mit zwei bekannten Teams) als (home, away, hg, ag) mit Store-Team-IDs."""
+    finished = store.finished & store.valid
+    return (store.home[finished].astype(np.int64), store.away[finished].astype(np.int64),
+            store.home_goals[finished].astype(np.int64)[None, :], store.away_goals[finished].astype(np.int64)[None, :])
+
+def _table_counts(matches):
+    """Punkte/Tore/Gegentore/Spiele/Siege/Auswärtstore/Auswärtssiege aller Teams (nur beendete Spiele), vektorisiert auf dem MatchStore."""
+    store = as_match_store(matches)
+    n_teams = len(store.teams)
+    home, away, hg, ag = _finished_results(store)
+    stats = tiebreakers.result_stats(n_teams, home, away, hg, ag, extended=True)
+    games = np.bincount(home, minlength=n_teams) + np.bincount(away, minlength=n_teams)
+    return pd.DataFrame({
+        'Punkte': stats['points'][0], 'Tore': stats['goals'][0], 'Gegentore': stats['against'][0], 'Spiele': games,
+        'Siege': stats['wins'][0], 'Auswärtstore': stats['away_goals'][0], 'Auswärtssiege': stats['away_wins'][0],
+    }, index=pd.Index(store.teams, dtype=object)).astype(np.int64)
+
+def _finalize_table(table_df, tiebreak=tiebreakers.DEFAULT_TIEBREAK, results=None):
+    """Diff ergänzen und nach Punkten + Tiebreakern des Wettbewerbs sortieren (results: für den direkten Vergleich)."""
+    table_df['Diff'] = table_df['Tore'] - table_df['Gegentore']
+    stats = {
+        'points': table_df['Punkte'].to_numpy()[None, :], 'diff': table_df['Diff'].to_numpy()[None, :],
+        'goals': table_df['Tore'].to_numpy()[None, :], 'wins': table_df['Siege'].to_numpy()[None, :],
+        'away_goals': table_df['Auswärtstore'].to_numpy()[None, :], 'away_wins': table_df['Auswärtssiege'].to_numpy()[None, :],
+    }
+    if tiebreak == 'head_to_head' and results is None:
+        tiebreak = tiebreakers.DEFAULT_TIEBREAK # Ohne Spielliste kein direkter Vergleich möglich
+    order = tiebreakers.rank_table(tiebreak, stats, results)[0]
+    return table_df.iloc[order]
+
+def calculate_current_table(matches, tiebreak=tiebreakers.DEFAULT_TIEBREAK):
+    """Aktuelle Tabelle aus MatchStore oder Match-DataFrame, sortiert nach den Tiebreak-Regeln des Wettbewerbs."""
+    if matches.empty: return pd.DataFrame(columns=['Punkte', 'Tore', 'Spiele', 'Diff'])
+
+    store = as_match_store(matches)
+    table_df = _table_counts(store)
     if not table_df.empty:
-        table_df['Diff'] = table_df['Tore'] - table_df['Gegentore']
-        return table_df.sort_values(by=['Punkte', 'Diff', 'Tore'], ascending=False)
+        return _finalize_table(table_df, tiebreak, _finished_results(store))
     return table_df
 
-def fetch_scorers_external(api_key, competition_id):
+def apply_results(table, new_matches, tiebreak=tiebreakers.DEFAULT_TIEBREAK, all_matches=None):
+    """
+    Rechnet neu beendete Spiele inkrementell in eine bestehende Tabelle ein,
+    ohne die ganze Saison neu zu berechnen. new_matches darf nur Spiele enthalten,
+    die in table noch nicht gezählt sind. Der direkte Vergleich braucht alle Spiele:
+    all_matches (Saison inkl. new_matches) geht nur in die Sortierung ein, ohne fällt
+    head_to_head auf Tordifferenz/Tore zurück.
+    """
+    if new_matches.empty: return table
+    if table.empty: return calculate_current_table(new_matches if all_matches is None else all_matches, tiebreak)
+
+    delta = _table_counts(new_matches)
+    base = table.reindex(columns=TABLE_COLUMNS, fill_value=0)
+    merged = base.add(delta, fill_value=0).astype(np.int64)
+    results = None
+    if tiebreak == 'head_to_head' and all_matches is not None:
+        store = as_match_store(all_matches)
+        home, away, hg, ag = _finished_results(store)
+        rows = merged.index.get_indexer(store.teams) # Store-Team-ID -> Tabellenzeile
+        known = (rows[home] >= 0) & (rows[away] >= 0)
+        results = (rows[home][known], rows[away][known], hg[:, known], ag[:, known])
+    return _finalize_table(merged, tiebreak, results)
+
+def fetch_scorers_external(api_key, competition_id, revalidate=False, fresh_seconds=None):
     if not api_key: return pd.DataFrame()
     headers = { 'X-Auth-Token': api_key }
     url = f"{FD_BASE_URL}/{competition_id}/scorers?limit=25"
-    data = make_api_request(url, headers)
+    data = make_api_request(url, headers, cache_key=payload_key(competition_id, 'scorers'), revalidate=revalidate,
+                            fresh_seconds=fresh_seconds)
     
     if not data: return pd.DataFrame()
     
@@ -117,4 +626,20 @@ def fetch_scorers_external(api_key, competition_id):
             'Assists': item.get('assists'),
             'Elfmeter': item.get('penalties')
         })
-    return pd.DataFrame(scorers_list)
\ No newline at end of file
+    return pd.DataFrame(scorers_list)
+
+def fetch_league_bundle(api_key, competition_id, season_year=None, executor=None, revalidate=False, scorers_fresh_seconds=None):
+    """
+    Lädt Matches und Torschützen einer Liga parallel. Liefert (MatchStore, team_logos, scorers).
+    scorers_fresh_seconds: Frische-Fenster nur für die Torschützen (siehe make_api_request).
+    """
+    own_executor = executor is None
+    if own_executor: executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        matches_future = executor.submit(metrics.bind(fetch_match_store), api_key, competition_id, season_year, revalidate)
+        scorers_future = executor.submit(metrics.bind(fetch_scorers_external), api_key, competition_id, revalidate,
+                                         scorers_fresh_seconds)
+        matches, team_logos = matches_future.result()
+        return matches, team_logos, scorers_future.result()
+    finally:
+        if own_executor: executor.shutdown(wait=False)
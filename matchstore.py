@@ -0,0 +1,133 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+class MatchStore:
+    """
+    Kompakter, spaltenweiser Speicher für die Spiele einer Liga.
+    Teamnamen werden einmal interniert (teams), Spiele verweisen per int16-ID darauf,
+    Tore als int16, beendet als bool-Maske, Datum als datetime64 (UTC), Stage als Categorical.
+    minute: Spielminute laufender Spiele (int16, -1 = nicht live), Tore sind dort der aktuelle Stand.
+    Alle Hot-Paths (Tabelle, Stärken, Simulation) arbeiten direkt auf diesen Arrays.
+    """
+    __slots__ = ('teams', 'home', 'away', 'home_goals', 'away_goals', 'finished', 'dates', 'stage', 'minute', '_key')
+
+    def __init__(self, teams, home, away, home_goals, away_goals, finished, dates, stage=None, minute=None):
+        self.teams = np.asarray(teams, dtype=object)
+        self.home = np.asarray(home, dtype=np.int16)
+        self.away = np.asarray(away, dtype=np.int16)
+        self.home_goals = np.asarray(home_goals, dtype=np.int16)
+        self.away_goals = np.asarray(away_goals, dtype=np.int16)
+        self.finished = np.asarray(finished, dtype=bool)
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.stage = stage if stage is not None else pd.Categorical([None] * len(self.home))
+        self.minute = np.asarray(minute if minute is not None else np.full(len(self.home), -1), dtype=np.int16)
+        self._key = None
+
+    # --- Konvertierung ---
+    @classmethod
+    def from_frame(cls, df):
+        """Aus dem DataFrame-Format von fetch_matches_external (leere/None-Teams bekommen ID -1)."""
+        if df.empty:
+            return cls([], [], [], [], [], [], [])
+        n = len(df)
+        codes, teams = pd.factorize(pd.concat([df['HomeTeam'], df['AwayTeam']]).replace("", None))
+        dates = df['Date'] if isinstance(df['Date'].dtype, pd.DatetimeTZDtype) else pd.to_datetime(df['Date'], utc=True)
+        dates = dates.dt.tz_convert(None).to_numpy(dtype='datetime64[ns]')
+        stage = pd.Categorical(df['Stage']) if 'Stage' in df.columns else None
+        minute = df['Minute'].fillna(-1).to_numpy() if 'Minute' in df.columns else None
+        return cls(list(teams), codes[:n], codes[n:], df['HomeGoals'].to_numpy(), df['AwayGoals'].to_numpy(),
+                   df['Finished'].to_numpy() == True, dates, stage, minute)
+
+    @classmethod
+    def from_columns(cls, dates, home_names, away_names, home_goals, away_goals, finished, stages, minutes=None):
+        """Direkt aus Spalten-Listen (z.B. beim Parsen der API-Antwort), ohne Zwischen-DataFrame."""
+        n = len(home_names)
+        codes, teams = pd.factorize(np.array(list(home_names) + list(away_names), dtype=object))
+        parsed = pd.to_datetime(pd.Series(dates, dtype=object), utc=True).dt.tz_convert(None).to_numpy(dtype='datetime64[ns]')
+        return cls(list(teams), codes[:n], codes[n:], home_goals, away_goals, finished, parsed, pd.Categorical(stages), minutes)
+
+    @classmethod
+    def concat(cls, stores):
+        """Hängt mehrere Stores aneinander (z.B. Vorsaisons + aktuelle Saison), Teams werden neu interniert."""
+        stores = [s for s in stores if s is not None and not s.empty]
+        if not stores: return cls([], [], [], [], [], [], [])
+        if len(stores) == 1: return stores[0]
+        codes, teams = pd.factorize(np.concatenate([s.teams for s in stores]))
+        offsets = np.cumsum([0] + [len(s.teams) for s in stores])
+        home, away = [], []
+        for s, start in zip(stores, offsets):
+            remap = np.append(codes[start:start + len(s.teams)], -1) # ID -1 bleibt -1
+            home.append(remap[s.home])
+            away.append(remap[s.away])
+        stage = pd.Categorical(np.concatenate([np.asarray(s.stage, dtype=object) for s in stores]))
+        return cls(list(teams), np.concatenate(home), np.concatenate(away),
+                   np.concatenate([s.home_goals for s in stores]), np.concatenate([s.away_goals for s in stores]),
+                   np.concatenate([s.finished for s in stores]), np.concatenate([s.dates for s in stores]), stage,
+                   np.concatenate([s.minute for s in stores]))
+
+    def to_frame(self):
+        """Zurück ins bisherige DataFrame-Format (Date tz-aware UTC, Teamnamen als Strings)."""
+        if self.empty:
+            return pd.DataFrame()
+        names = np.append(self.teams, None)   # ID -1 -> None
+        return pd.DataFrame({
+            'Date': pd.to_datetime(self.dates).tz_localize('UTC'),
+            'HomeTeam': names[self.home], 'AwayTeam': names[self.away],
+            'HomeGoals': self.home_goals.astype(np.int64), 'AwayGoals': self.away_goals.astype(np.int64),
+            'Finished': self.finished, 'Stage': np.asarray(self.stage, dtype=object), 'Minute': self.minute.astype(np.int64),
+        })
+
+    # --- Zugriff ---
+    def __len__(self):
+        return len(self.home)
+
+    @property
+    def empty(self):
+        return len(self.home) == 0
+
+    @property
+    def live(self):
+        """Laufende Spiele (angepfiffen, noch nicht beendet)."""
+        return self.minute >= 0
+
+    @property
+    def valid(self):
+        """Spiele mit zwei bekannten Teams."""
+        return (self.home >= 0) & (self.away >= 0)
+
+    def subset(self, mask):
+        """Teilmenge der Spiele (gleiche Team-IDs)."""
+        store = MatchStore.__new__(MatchStore)
+        store.teams = self.teams
+        for name in ('home', 'away', 'home_goals', 'away_goals', 'finished', 'dates', 'minute'):
+            setattr(store, name, getattr(self, name)[mask])
+        store.stage = self.stage[mask]
+        store._key = None
+        return store
+
+    def team_ids_for(self, names):
+        """Übersetzt die internen Team-IDs in Indizes einer fremden Namensliste (-1 = nicht enthalten)."""
+        index = {name: i for i, name in enumerate(names)}
+        return np.array([index.get(team, -1) for team in self.teams] + [-1], dtype=np.int64)
+
+    def snapshot_key(self):
+        """Stabiler Hash über Teams, Paarungen, Tore, Status, Datum und Spielminute."""
+        if self._key is None:
+            h = hashlib.sha1()
+            h.update("\x1f".join(map(str, self.teams)).encode())
+            for arr in (self.home, self.away, self.home_goals, self.away_goals, self.finished, self.dates.view(np.int64), self.minute):
+                h.update(np.ascontiguousarray(arr).tobytes())
+            self._key = h.hexdigest()
+        return self._key
+
+    @property
+    def nbytes(self):
+        arrays = (self.home, self.away, self.home_goals, self.away_goals, self.finished, self.dates, self.minute)
+        return sum(a.nbytes for a in arrays) + self.stage.nbytes + sum(len(str(t)) for t in self.teams)
+
+def as_match_store(matches):
+    """Akzeptiert MatchStore oder DataFrame (altes Format) und liefert einen MatchStore."""
+    if isinstance(matches, MatchStore): return matches
+    return MatchStore.from_frame(matches)
@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Datei, in die nach jedem Refresh alle Metriken geschrieben werden
+METRICS_PATH = os.environ.get("FUSSBALL_METRICS_PATH", os.path.join(".cache", "metrics.json"))
+REFRESH_HISTORY = 10 # Letzte N Refreshs pro Liga
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_refreshes = defaultdict(lambda: deque(maxlen=REFRESH_HISTORY))
+_local = threading.local()
+
+def incr(name, value=1):
+    """Globaler Zähler (API-Calls, Retries, Cache-Hits, Simulationen, ...)."""
+    with _lock:
+        _counters[name] += value
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+@contextmanager
+def refresh(league_name):
+    """Klammert einen kompletten Liga-Refresh; span() darin landet in dessen Aufschlüsselung."""
+    trace = {'league': league_name, 'started': time.time(), 'stages': {}, 'total': 0.0, 'error': None}
+    _local.trace = trace
+    start = time.perf_counter()
+    try:
+        yield trace
+    except Exception as e:
+        trace['error'] = str(e)
+        raise
+    finally:
+        trace['total'] = time.perf_counter() - start
+        _local.trace = None
+        with _lock:
+            _refreshes[league_name].append(trace)
+        incr('refreshes')
+
+@contextmanager
+def span(name):
+    """Misst eine Phase (HTTP, Stärken, Monte-Carlo, ...) im aktuellen Refresh des Threads."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        incr(f'seconds.{name}', elapsed)
+        trace = getattr(_local, 'trace', None)
+        if trace is not None:
+            trace['stages'][name] = trace['stages'].get(name, 0.0) + elapsed
+
+def bind(func):
+    """Gibt func den Refresh-Kontext des aufrufenden Threads mit (für Thread-Pools innerhalb eines Refreshs)."""
+    trace = getattr(_local, 'trace', None)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, 'trace', None)
+        _local.trace = trace
+        try: return func(*args, **kwargs)
+        finally: _local.trace = previous
+    return wrapper
+
+def recent_refreshes(league_name=None):
+    with _lock:
+        if league_name is not None: return list(_refreshes.get(league_name, []))
+        return {name: list(traces) for name, traces in _refreshes.items()}
+
+def snapshot():
+    return {'generated': time.time(), 'counters': counters(), 'refreshes': recent_refreshes()}
+
+def export_json():
+    return json.dumps(snapshot(), indent=2, sort_keys=True)
+
+def write(path=None):
+    """Schreibt alle Metriken atomar als JSON-Datei (für externe Auswertung)."""
+    path = path or METRICS_PATH
+    directory = os.path.dirname(path)
+    if directory: os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f: f.write(export_json())
+    os.replace(tmp_path, path)
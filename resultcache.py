@@ -0,0 +1,90 @@
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# Obergrenze für alle gecachten Liga-Ergebnisse und Simulationszustände zusammen
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("FUSSBALL_RESULT_CACHE_MB", "128")) * 2**20
+
+def estimate_size(value):
+    """Geschätzter Speicherbedarf in Bytes (DataFrames inkl. Strings, Arrays, MatchStore, Container rekursiv)."""
+    if isinstance(value, (pd.DataFrame, pd.Series)): return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, np.ndarray): return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)): return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    if hasattr(value, 'nbytes'): return int(value.nbytes)
+    return sys.getsizeof(value)
+
+def frame_digest(df):
+    """Stabiler Hash über Inhalt und Index eines DataFrames (z.B. Torschützen)."""
+    if df is None or df.empty: return "empty"
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes()).hexdigest()
+
+def result_key(league_name, *parts):
+    """Schlüssel (Liga, Hash über Match-Stand, Modellversion, ...): neue Daten oder neues Modell -> neuer Eintrag."""
+    return (league_name, hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest())
+
+def state_key(league_name):
+    """Schlüssel für den Simulationszustand einer Liga (inkrementelle Refreshs, Szenarien): ein Eintrag pro Liga."""
+    return (league_name, 'season_state')
+
+class ResultCache:
+    """
+    LRU-Cache für fertige Liga-Ergebnisse mit Speicherobergrenze.
+    Ein Refresh mit unverändertem Match-Stand trifft denselben Schlüssel und spart die Simulation,
+    ältere Stände fallen nach und nach heraus, sobald max_bytes überschritten ist.
+    Die Simulationszustände der Ligen (state_key, je ~10-19 MB) zählen zum selben Budget: verdrängt wird
+    zuerst der Zustand selten aktualisierter Ligen, deren nächster Refresh dann komplett neu simuliert.
+    """
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # key -> (value, size)
+        self._bytes = 0
+        self._hits = self._misses = self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                metrics.incr('result_cache_misses')
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        metrics.incr('result_cache_hits')
+        return entry[0]
+
+    def put(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            # Älteste zuerst raus, der neue Eintrag bleibt immer erhalten
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self._evictions += 1
+                metrics.incr('result_cache_evictions')
+
+    def clear(self, league_name=None):
+        with self._lock:
+            for key in [k for k in self._entries if league_name is None or k[0] == league_name]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes,
+                'hits': self._hits, 'misses': self._misses, 'evictions': self._evictions,
+                'leagues': sorted({key[0] for key in self._entries}),
+            }
@@ -0,0 +1,108 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Normaler Refresh deutlich vor Ablauf der 1h, bei Live-/gerade beendeten Spielen öfter
+REFRESH_SECONDS = 50 * 60
+HOT_REFRESH_SECONDS = 5 * 60
+# Laufende Spiele: kurzes Polling. Das inkrementelle Update kostet auf einem Kern gemessen ~0.25 s (Bundesliga),
+# ~0.45 s (La Liga, direkter Vergleich) und ~0.9-1.1 s (CL inkl. K.o.-Phase), mit Prozess-Pool entsprechend weniger
+LIVE_REFRESH_SECONDS = 60
+STAGGER_SECONDS = 30
+RETRY_SECONDS = 60
+
+class LeagueScheduler:
+    """
+    Hintergrund-Worker, der alle Ligen regelmäßig neu lädt & simuliert.
+    Fertige Ergebnisse werden atomar ausgetauscht, Seitenaufrufe lesen nur noch
+    bereits berechnete Ergebnisse und lösen selbst keine Simulation aus.
+    """
+    def __init__(self, compute, league_names, is_hot=None, max_workers=None,
+                 refresh_seconds=REFRESH_SECONDS, hot_refresh_seconds=HOT_REFRESH_SECONDS, stagger_seconds=STAGGER_SECONDS,
+                 is_live=None, live_refresh_seconds=LIVE_REFRESH_SECONDS):
+        self.compute = compute
+        self.league_names = list(league_names)
+        self.is_hot = is_hot or (lambda result: False)
+        self.is_live = is_live or (lambda result: False)
+        self.refresh_seconds = refresh_seconds
+        self.hot_refresh_seconds = hot_refresh_seconds
+        self.live_refresh_seconds = live_refresh_seconds
+        self.stagger_seconds = stagger_seconds
+
+        self._results = {}
+        self._hot = {name: False for name in self.league_names}
+        self._live = {name: False for name in self.league_names}
+        self._next_run = {name: 0.0 for name in self.league_names} # Erster Durchlauf sofort
+        self._running = set()
+        self._requeue = set() # Refresh angefordert, während die Liga gerade lief
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or len(self.league_names))
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="league-scheduler")
+
+    def start(self):
+        if not self._thread.is_alive(): self._thread.start()
+        return self
+
+    # --- Lesen (Seitenaufrufe) ---
+    def get(self, league_name, timeout=None):
+        """Liefert das letzte fertige Ergebnis; wartet nur beim allerersten Lauf auf die Berechnung."""
+        with self._cond:
+            self._cond.wait_for(lambda: league_name in self._results, timeout=timeout)
+            return self._results.get(league_name)
+
+    def has_result(self, league_name):
+        with self._cond:
+            return league_name in self._results
+
+    # --- Steuerung (Admin) ---
+    def refresh(self, league_name=None):
+        """Plant einen sofortigen Refresh (eine Liga oder alle), ohne darauf zu warten."""
+        with self._cond:
+            for name in ([league_name] if league_name else self.league_names):
+                self._next_run[name] = 0.0
+                if name in self._running: self._requeue.add(name)
+            self._cond.notify_all()
+
+    # --- Worker ---
+    def _due_leagues(self, now):
+        due = [n for n in self.league_names if n not in self._running and self._next_run[n] <= now]
+        # Ligen mit Live-/gerade beendeten Spielen zuerst, danach die am längsten fälligen
+        return sorted(due, key=lambda n: (not self._hot[n], self._next_run[n]))
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                now = time.time()
+                due = self._due_leagues(now)
+                if not due:
+                    pending = [self._next_run[n] for n in self.league_names if n not in self._running]
+                    timeout = max(0.0, min(pending) - now) if pending else None
+                    self._cond.wait(timeout=timeout)
+                    continue
+                for name in due:
+                    self._running.add(name)
+            for name in due:
+                self._executor.submit(self._run_one, name)
+
+    def _run_one(self, league_name):
+        result = None
+        try:
+            result = self.compute(league_name)
+        except Exception as e:
+            print(f"Fehler Hintergrund-Refresh {league_name}: {e}")
+        with self._cond:
+            if result is not None:
+                self._results[league_name] = result # Atomarer Austausch
+                self._hot[league_name] = bool(self.is_hot(result))
+                self._live[league_name] = bool(self.is_live(result))
+            interval = self.hot_refresh_seconds if self._hot[league_name] else self.refresh_seconds
+            if self._live[league_name]: interval = self.live_refresh_seconds
+            if league_name not in self._results: interval = min(interval, RETRY_SECONDS) # Noch nie erfolgreich
+            # Versatz pro Liga, damit nicht alle Refreshs gleichzeitig fällig werden (live: kein Versatz)
+            offset = 0 if self._live[league_name] else self.league_names.index(league_name) * self.stagger_seconds
+            self._next_run[league_name] = time.time() + interval + offset
+            if league_name in self._requeue:
+                self._requeue.discard(league_name)
+                self._next_run[league_name] = 0.0
+            self._running.discard(league_name)
+            self._cond.notify_all()
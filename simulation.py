@@ -1,47 +1,228 @@
 import numpy as np
 import pandas as pd
-import math
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from statistics import NormalDist
+import metrics
+import tiebreakers
+from matchstore import MatchStore, as_match_store
 
-def calculate_smart_strengths(df_matches):
-    played = df_matches[df_matches['Finished'] == True].copy()
-    if played.empty: return {}, 3.0 
-    
-    played['CalcHomeGoals'] = played['HomeGoals']
-    played['CalcAwayGoals'] = played['AwayGoals']
-    played = played.sort_values(by='Date')
-    total_games = len(played)
-    played['Weight'] = 1.0
-    if total_games > 5:
-        played.iloc[-int(total_games*0.3):, played.columns.get_loc('Weight')] = 2.0
-    
-    weighted_goals = (played['CalcHomeGoals'] * played['Weight']).sum() + (played['CalcAwayGoals'] * played['Weight']).sum()
-    weighted_count = played['Weight'].sum() * 2 
-    avg_goals = weighted_goals / weighted_count if weighted_count > 0 else 3.0
-    
-    stats = {}
-    # Filtert None/Empty Teams raus
-    all_teams = pd.concat([played['HomeTeam'], played['AwayTeam']])
-    teams = all_teams[all_teams.notna() & (all_teams != "")].unique()
-    
-    for team in teams:
-        home = played[played['HomeTeam'] == team]
-        away = played[played['AwayTeam'] == team]
-        scored = (home['CalcHomeGoals'] * home['Weight']).sum() + (away['CalcAwayGoals'] * away['Weight']).sum()
-        conceded = (home['CalcAwayGoals'] * home['Weight']).sum() + (away['CalcHomeGoals'] * away['Weight']).sum()
-        weighted_games = home['Weight'].sum() + away['Weight'].sum()
-        
-        if weighted_games > 0:
-            att = (scored / weighted_games) / avg_goals
-            defn = (conceded / weighted_games) / avg_goals
+# Bei jeder Änderung an Modell/Simulation erhöhen: gecachte Ergebnisse älterer Versionen werden dann nicht mehr verwendet
+MODEL_VERSION = 3 # 2: CL-K.o.-Phase auf echten Paarungen, Simulationszustand mit gepackten Treffern; 3: gepackte Ergebnisse, schmale Kennzahlen
+
+def matches_snapshot_key(matches):
+    """Stabiler Hash über einen Match-Stand (MatchStore oder DataFrame), für Memoization/Cache-Keys."""
+    return as_match_store(matches).snapshot_key()
+
+class LockedLRU:
+    """
+    Kleiner LRU-Cache mit fester Anzahl Einträge, threadsicher: der Scheduler rechnet mehrere Ligen
+    parallel, gleichzeitiges Verdrängen desselben ältesten Eintrags darf nicht scheitern.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries: return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+_STRENGTH_CACHE_SIZE = 16
+_STRENGTH_CACHE = LockedLRU(_STRENGTH_CACHE_SIZE)
+_WARM_STARTS = LockedLRU(_STRENGTH_CACHE_SIZE) # Teams der aktuellen Saison -> letzter Fit (Startwerte für den nächsten Refresh)
+
+STRENGTH_HALF_LIFE_DAYS = 180 # Ein Spiel zählt nach einem halben Jahr nur noch halb
+HOME_ADVANTAGE = 1.2          # Fallback, solange (noch) kein Modell gefittet werden kann
+FIT_RIDGE = 2.0               # Shrinkage der Team-Parameter Richtung Ligaschnitt (wirkt wie ~1 Spiel Vorwissen)
+FIT_MAX_ITER = 50
+FIT_TOL = 1e-6
+RHO_BOUNDS = (-0.2, 0.2)      # Hält alle Dixon-Coles-Faktoren positiv
+
+def _fit_poisson_glm(home, away, hg, ag, weight, n_teams, theta):
+    """
+    Gewichtete Poisson-Regression mit Ridge-Strafe auf Angriff/Abwehr:
+    log λ_heim = μ + η + α_heim + δ_gast,  log λ_gast = μ + α_gast + δ_heim
+    (α Angriff, δ Gegentore, μ Torniveau, η Heimvorteil; Parametervektor [α, δ, μ, η]).
+    Gedämpftes Newton-Verfahren, Gradient und Hessematrix per bincount.
+    Liefert (theta, Iterationen).
+    """
+    n_params = 2 * n_teams + 2
+    dummy = n_params # Gasttore haben keinen Heimvorteil -> Platzhalter-Spalte
+    mu, eta = np.full_like(home, 2 * n_teams), np.full_like(home, 2 * n_teams + 1)
+    cols = np.concatenate([np.stack([home, n_teams + away, mu, eta], axis=1),
+                           np.stack([away, n_teams + home, mu, np.full_like(home, dummy)], axis=1)])
+    goals = np.concatenate([hg, ag])
+    w = np.concatenate([weight, weight])
+    penalty = np.r_[np.full(2 * n_teams, FIT_RIDGE), 0.0, 0.0]
+    pairs = (cols[:, :, None] * (n_params + 1) + cols[:, None, :]).ravel()
+
+    def objective(th):
+        linear = np.append(th, 0.0)[cols].sum(axis=1)
+        lam = np.exp(linear)
+        return (w * (lam - goals * linear)).sum() + 0.5 * (penalty * th ** 2).sum(), lam
+
+    value, lam = objective(theta)
+    for iteration in range(1, FIT_MAX_ITER + 1):
+        grad = np.bincount(cols.ravel(), weights=np.repeat(w * (lam - goals), 4), minlength=n_params + 1)[:n_params]
+        grad += penalty * theta
+        hess = np.bincount(pairs, weights=np.repeat(w * lam, 16), minlength=(n_params + 1) ** 2)
+        hess = hess.reshape(n_params + 1, n_params + 1)[:n_params, :n_params]
+        hess[np.diag_indices(n_params)] += penalty + 1e-9
+        step = np.linalg.solve(hess, grad)
+
+        t = 1.0 # Schrittweite halbieren, bis die Zielfunktion nicht mehr steigt
+        while True:
+            candidate = theta - t * step
+            new_value, new_lam = objective(candidate)
+            if new_value <= value or t < 1e-4: break
+            t *= 0.5
+        theta, value, lam = candidate, new_value, new_lam
+        if np.abs(t * step).max() < FIT_TOL: break
+    return theta, iteration
+
+def _fit_dixon_coles_rho(hg, ag, lam_h, lam_a, weight, rho=0.0):
+    """
+    Dixon-Coles-Korrelation ρ der knappen Ergebnisse (0:0, 1:0, 0:1, 1:1) bei festen λ, per 1D-Newton.
+    In allen vier Zellen gilt τ = 1 + ρ·c mit c = -λh·λa, λh, λa bzw. -1.
+    """
+    low = (hg <= 1) & (ag <= 1)
+    if not low.any(): return rho
+    hg, ag, w = hg[low], ag[low], weight[low]
+    c = np.select([(hg == 0) & (ag == 0), (hg == 0) & (ag == 1), (hg == 1) & (ag == 0)],
+                  [-lam_h[low] * lam_a[low], lam_h[low], lam_a[low]], -1.0)
+    for _ in range(FIT_MAX_ITER):
+        ratio = c / (1 + rho * c)
+        step = (w * ratio).sum() / max((w * ratio ** 2).sum(), 1e-12)
+        new_rho = float(np.clip(rho + step, *RHO_BOUNDS))
+        if abs(new_rho - rho) < FIT_TOL: return new_rho
+        rho = new_rho
+    return rho
+
+def fit_team_model(matches, history=None, half_life_days=STRENGTH_HALF_LIFE_DAYS):
+    """
+    Gefittetes Dixon-Coles-Modell der Liga: Poisson-GLM für Angriff/Abwehr/Heimvorteil plus
+    Korrelation ρ für knappe Ergebnisse. Jedes Spiel wird exponentiell nach Alter gewichtet
+    (Halbwertszeit half_life_days, bezogen auf das letzte beendete Spiel); mit history
+    (MatchStore der Vorsaisons) fließen auch frühere Spielzeiten ein.
+
+    Dict mit teams, attack, defense (multiplikativ, 1.0 = Ligaschnitt), avg_goals,
+    home_advantage, rho und iterations. Ergebnis wird pro Match-Stand gemerkt; neue Fits
+    starten beim letzten Fit derselben Liga (Team-Parameter, Ligaschnitt, Heimvorteil und ρ).
+    Newton konvergiert ohnehin schnell: nach einem neuen Spieltag spart der Warmstart gemessen
+    1-2 der 5-6 Iterationen (synthetische Ligen, 18-20 Teams), ein Fit kostet dann ~1 ms.
+    """
+    store = as_match_store(matches)
+    key = store.subset(store.finished).snapshot_key() # Nur beendete Spiele zählen: Verlegungen lösen keinen neuen Fit aus
+    warm_key = frozenset(store.teams)
+    if history is not None and not history.empty:
+        key = f"{key}|{history.snapshot_key()}"
+        store = MatchStore.concat([history, store])
+    key = f"{key}|{half_life_days}"
+    cached = _STRENGTH_CACHE.get(key)
+    if cached is not None:
+        metrics.incr('strength_cache_hits')
+        return cached
+    metrics.incr('strength_cache_misses')
+
+    played = np.flatnonzero(store.finished & store.valid)
+    if not len(played):
+        model = {'teams': [], 'attack': np.zeros(0), 'defense': np.zeros(0), 'avg_goals': 3.0,
+                 'home_advantage': HOME_ADVANTAGE, 'rho': 0.0, 'iterations': 0}
+    else:
+        played = played[np.argsort(store.dates[played], kind='stable')]
+        age_days = (store.dates[played[-1]] - store.dates[played]) / np.timedelta64(1, 'D')
+        weight = np.exp2(-age_days / half_life_days)
+        hg = store.home_goals[played].astype(float)
+        ag = store.away_goals[played].astype(float)
+
+        # Teams in Reihenfolge des Auftretens (erst Heim-, dann Gastspalte) neu durchnummerieren
+        ids = np.concatenate([store.home[played], store.away[played]]).astype(np.int64)
+        seen, first = np.unique(ids, return_index=True)
+        team_ids = seen[np.argsort(first)]
+        teams = list(store.teams[team_ids])
+        n_teams = len(teams)
+        remap = np.full(len(store.teams), -1, dtype=np.int64)
+        remap[team_ids] = np.arange(n_teams)
+        home, away = remap[ids[:len(played)]], remap[ids[len(played):]]
+
+        # Startwerte: letzter Fit dieser Liga (Teams per Name zugeordnet), sonst Ligaschnitt
+        warm = _WARM_STARTS.get(warm_key)
+        theta = np.zeros(2 * n_teams + 2)
+        rho = 0.0
+        if warm is not None:
+            for i, team in enumerate(teams):
+                if team in warm['params']: theta[i], theta[n_teams + i] = warm['params'][team]
+            theta[-2:], rho = warm['mu_eta'], warm['rho']
         else:
-            att, defn = 1.0, 1.0
-        stats[team] = {'attack': att, 'defense': defn}
+            mean_goals = (weight * (hg + ag)).sum() / (2 * weight.sum())
+            theta[-2] = np.log(max(mean_goals, 0.1))
+
+        theta, iterations = _fit_poisson_glm(home, away, hg, ag, weight, n_teams, theta)
+        alpha, delta, mu, eta = theta[:n_teams], theta[n_teams:2 * n_teams], theta[-2], theta[-1]
+        lam_h = np.exp(mu + eta + alpha[home] + delta[away])
+        lam_a = np.exp(mu + alpha[away] + delta[home])
+        rho = _fit_dixon_coles_rho(hg, ag, lam_h, lam_a, weight, rho)
+
+        metrics.incr('model_fits')
+        metrics.incr('model_fit_iterations', iterations)
+        _WARM_STARTS.put(warm_key, {'params': dict(zip(teams, zip(alpha, delta))), 'mu_eta': theta[-2:].copy(), 'rho': rho})
+        model = {'teams': teams, 'attack': np.exp(alpha), 'defense': np.exp(delta), 'avg_goals': float(np.exp(mu)),
+                 'home_advantage': float(np.exp(eta)), 'rho': rho, 'iterations': iterations}
+
+    for arr in (model['attack'], model['defense']): arr.setflags(write=False)
+    _STRENGTH_CACHE.put(key, model)
+    return model
+
+def calculate_strength_arrays(matches, history=None, half_life_days=STRENGTH_HALF_LIFE_DAYS):
+    """Stärken aus fit_team_model als (teams, attack, defense, avg_goals) mit zueinander ausgerichteten Arrays."""
+    model = fit_team_model(matches, history, half_life_days)
+    return model['teams'], model['attack'], model['defense'], model['avg_goals']
+
+def calculate_smart_strengths(matches, history=None):
+    teams, attack, defense, avg_goals = calculate_strength_arrays(matches, history)
+    stats = {team: {'attack': att, 'defense': defn} for team, att, defn in zip(teams, attack, defense)}
     return stats, avg_goals
 
-def simulate_match_poisson(team1, team2, stats, avg_goals, home_advantage=1.2, performance_boost=None):
+def as_generator(rng=None):
+    """Akzeptiert None, int-Seed, SeedSequence oder Generator und liefert einen numpy Generator."""
+    if isinstance(rng, np.random.Generator): return rng
+    return np.random.default_rng(rng)
+
+def spawn_generators(rng, n):
+    """Unabhängige Kind-Streams (z.B. für Worker/Shards) aus einem Seed oder Generator."""
+    if isinstance(rng, np.random.Generator): return rng.spawn(n)
+    seed_seq = rng if isinstance(rng, np.random.SeedSequence) else np.random.SeedSequence(rng)
+    return [np.random.default_rng(s) for s in seed_seq.spawn(n)]
+
+def snapshot_seed(matches):
+    """Seed aus dem Match-Stand: gleiche Daten -> gleiche Simulation, neue Ergebnisse -> neuer Seed."""
+    return int(matches_snapshot_key(matches)[:16], 16)
+
+def simulate_match_poisson(team1, team2, stats, avg_goals, home_advantage=HOME_ADVANTAGE, performance_boost=None, rng=None):
     """
     Simuliert ein Spiel mit Performance-Boosts aus der Ligaphase.
     """
+    rng = as_generator(rng)
     t1_s = stats.get(team1, {'attack': 1, 'defense': 1})
     t2_s = stats.get(team2, {'attack': 1, 'defense': 1})
     
@@ -53,215 +234,1067 @@ def simulate_match_poisson(team1, team2, stats, avg_goals, home_advantage=1.2, p
     lam1 = t1_s['attack'] * t2_s['defense'] * avg_goals * home_advantage * boost1
     lam2 = t2_s['attack'] * t1_s['defense'] * avg_goals * boost2 # Gast hat keinen Heimvorteil
     
-    return np.random.poisson(lam1), np.random.poisson(lam2)
+    return rng.poisson(lam1), rng.poisson(lam2)
 
-def generate_cl_bracket(matches, current_table):
+def generate_cl_bracket(matches, current_table, rng=None, history=None):
     """
-    Simuliert EINEN kompletten Turnierbaum für die Anzeige im UI.
-    Nutzt Form-Boosts basierend auf der Ligatabelle.
+    Simuliert EINEN kompletten Turnierbaum für die Anzeige im UI, mit demselben K.O.-Motor wie die
+    Monte-Carlo: bekannte Paarungen mit ihren echten Ergebnissen, Form-Boosts nach der Ligatabelle.
     """
-    stats, avg_goals = calculate_smart_strengths(matches)
-    
-    # 1. Ligaphase zu Ende simulieren (einmalig für dieses Szenario)
-    future = matches[matches['Finished'] == False]
-    sim_table = current_table.copy()
-    
-    # Tabelle bereinigen
-    sim_table = sim_table[sim_table.index.notna() & (sim_table.index != "")]
-    
-    for _, match in future.iterrows():
-        h, a = match['HomeTeam'], match['AwayTeam']
-        if not h or not a: continue
-        g1, g2 = simulate_match_poisson(h, a, stats, avg_goals)
-        if g1 > g2: sim_table.loc[h, 'Punkte'] += 3
-        elif g2 > g1: sim_table.loc[a, 'Punkte'] += 3
-        else: 
-            sim_table.loc[h, 'Punkte'] += 1; sim_table.loc[a, 'Punkte'] += 1
-            
-    # Ranking finalisieren
-    sim_table = sim_table.sort_values(by=['Punkte', 'Diff', 'Tore'], ascending=False)
-    ranking = sim_table.index.tolist()
-    
-    # --- PERFORMANCE BOOST BERECHNEN ---
-    # Wer viele Punkte/Tore geholt hat, geht gestärkt in die K.O. Runde
-    performance_boost = {}
-    max_points = sim_table['Punkte'].max() if not sim_table.empty else 1
-    
-    for team in ranking:
-        points = sim_table.loc[team, 'Punkte']
-        # Faktor: 1.0 (Basis) + bis zu 0.2 Bonus für Punkte
-        boost = 1.0 + (points / max_points) * 0.2
-        performance_boost[team] = boost
+    rng = as_generator(rng)
+    store = as_match_store(matches)
+    home_advantage = fit_team_model(store, history)['home_advantage']
 
-    # --- K.O. PHASE SIMULIEREN ---
-    scenario = [] # Liste der Matches für UI
-    
-    # A) Playoffs (9-24)
-    playoff_winners = []
-    seeded = ranking[8:16]
-    unseeded = ranking[16:24]
-    
-    # Wir nehmen an: Seeded spielt Rückspiel Heim
-    for i in range(len(seeded)):
-        t1 = unseeded[i]
-        t2 = seeded[i]
-        
-        # Hinspiel
-        h1, a1 = simulate_match_poisson(t1, t2, stats, avg_goals, home_advantage=1.2, performance_boost=performance_boost)
-        # Rückspiel
-        h2, a2 = simulate_match_poisson(t2, t1, stats, avg_goals, home_advantage=1.2, performance_boost=performance_boost)
-        
-        agg1 = h1 + a2
-        agg2 = a1 + h2
-        winner = t1 if agg1 > agg2 else t2
-        if agg1 == agg2: winner = np.random.choice([t1, t2]) # Elfer
-        
-        playoff_winners.append(winner)
-        scenario.append({
-            "Runde": "Playoffs", 
-            "Heim": t2, "Gast": t1, 
-            "Ergebnis": f"{h2}:{a2} ({a1}:{h1})", 
-            "Sieger": winner
-        })
-        
-    # B) Achtelfinale
-    top8 = ranking[0:8]
-    r16_winners = []
-    # Top 8 gesetzt vs Playoff Winner
-    np.random.shuffle(playoff_winners)
-    
-    for i in range(8):
-        t1 = playoff_winners[i]
-        t2 = top8[i]
-        
-        h1, a1 = simulate_match_poisson(t1, t2, stats, avg_goals, 1.2, performance_boost)
-        h2, a2 = simulate_match_poisson(t2, t1, stats, avg_goals, 1.2, performance_boost)
-        
-        agg1 = h1 + a2
-        agg2 = a1 + h2
-        winner = t1 if agg1 > agg2 else t2
-        if agg1 == agg2: winner = np.random.choice([t1, t2])
-        
-        r16_winners.append(winner)
-        scenario.append({"Runde": "Achtelfinale", "Heim": t2, "Gast": t1, "Ergebnis": f"{h2}:{a2} ({a1}:{h1})", "Sieger": winner})
-
-    # C) Viertelfinale bis Finale (Standard KO)
-    current_round_teams = r16_winners
-    rounds = ["Viertelfinale", "Halbfinale", "Finale"]
-    
-    for r_name in rounds:
-        next_round_teams = []
-        np.random.shuffle(current_round_teams)
-        
-        for i in range(0, len(current_round_teams), 2):
-            if i+1 >= len(current_round_teams): break
-            t1 = current_round_teams[i]
-            t2 = current_round_teams[i+1]
-            
-            is_final = (r_name == "Finale")
-            home_adv = 1.0 if is_final else 1.2 # Kein Heimvorteil im Finale
-            
-            if is_final:
-                h, a = simulate_match_poisson(t1, t2, stats, avg_goals, home_adv, performance_boost)
-                winner = t1 if h > a else t2
-                if h == a: winner = np.random.choice([t1, t2])
-                res_str = f"{h}:{a}"
-            else:
-                h1, a1 = simulate_match_poisson(t1, t2, stats, avg_goals, home_adv, performance_boost)
-                h2, a2 = simulate_match_poisson(t2, t1, stats, avg_goals, home_adv, performance_boost)
-                agg1 = h1 + a2
-                agg2 = a1 + h2
-                winner = t1 if agg1 > agg2 else t2
-                if agg1 == agg2: winner = np.random.choice([t1, t2])
-                res_str = f"{h1}:{a1} / {h2}:{a2}"
-                
-            next_round_teams.append(winner)
-            scenario.append({"Runde": r_name, "Heim": t1, "Gast": t2, "Ergebnis": res_str, "Sieger": winner})
-            
-        current_round_teams = next_round_teams
+    # 1. Ligaphase zu Ende simulieren (einmalig für dieses Szenario, alle offenen Spiele auf einmal)
+    sim_table = current_table[current_table.index.notna() & (current_table.index != "")]
+    teams = sim_table.index.tolist()
+    if len(teams) < 24: return pd.DataFrame()
+    attack, defense, _, avg_goals = _table_aligned_strengths(teams, store, history)
+    home_idx, away_idx, rows = _encode_fixtures(store, teams, league_stage_mask(store))
+    score_table = fixture_score_table(store, history)
+    middle = FORM_LEVELS // 2 # Neutrale Form
+    neutral = np.full((1, len(rows)), middle)
+    g1, g2 = sample_scores(rng, score_sampler(score_table, score_table['position'][rows]), neutral, neutral)
+    sim = tiebreakers.result_stats(len(teams), home_idx, away_idx, g1, g2, extended=True)
+    stats = {key: _table_column(sim_table, col)[None, :] + sim[key] for key, col in TABLE_STATS.items()}
+
+    # Ranking finalisieren (UEFA-Tiebreaker mit den simulierten Toren)
+    ranking = tiebreakers.rank_table('uefa', stats)
 
+    # 2. K.O.-Phase (wer viele Punkte geholt hat, geht gestärkt hinein)
+    games = []
+    simulate_cl_knockout_batch(rng, ranking, stats['points'], attack[None, :], defense[None, :], avg_goals, home_advantage,
+                               _encode_knockout(store, teams), games)
+    scenario = [] # Liste der Matches für UI
+    for r_name, t1, t2, goals1, goals2, home_is_t1, winners in games:
+        home_is_t1 = np.broadcast_to(home_is_t1, goals1.shape[1:])
+        for k in range(t1.shape[1]):
+            legs = [f"{goals1[0, k, j]}:{goals2[0, k, j]}" if home_is_t1[k, j] else f"{goals2[0, k, j]}:{goals1[0, k, j]}"
+                    for j in range(goals1.shape[2])]
+            scenario.append({"Runde": r_name, "Heim": teams[t1[0, k]], "Gast": teams[t2[0, k]],
+                             "Ergebnis": " / ".join(legs), "Sieger": teams[winners[0, k]]})
     return pd.DataFrame(scenario)
 
-def simulate_season(df_matches, current_table, n_simulations=500, is_cl=False):
-    # Basis-Simulation für Wahrscheinlichkeiten (bleibt wie gehabt)
+def _table_aligned_strengths(teams, store, history=None):
+    """
+    Stärken in der Reihenfolge der Tabellen-Teams.
+    Teams ohne Statistik bekommen neutrale Stärke (1.0) und keinen Formfaktor.
+    """
+    s_teams, s_attack, s_defense, avg_goals = calculate_strength_arrays(store, history)
+    team_index = {team: i for i, team in enumerate(teams)}
+    pos = np.array([team_index.get(t, -1) for t in s_teams], dtype=np.int64)
+    known = pos >= 0
+    attack, defense = np.ones(len(teams)), np.ones(len(teams))
+    has_stats = np.zeros(len(teams), dtype=bool)
+    attack[pos[known]] = s_attack[known]
+    defense[pos[known]] = s_defense[known]
+    has_stats[pos[known]] = True
+    return attack, defense, has_stats, avg_goals
+
+def _encode_fixtures(store, teams, mask=None):
+    """
+    Offene Spiele als int-Arrays (Heim-/Gast-Index in teams, Zeile im Store).
+    Spiele mit unbekannten Teams fallen raus; mask: nur diese Spiele (z.B. Ligaphase).
+    """
+    remap = store.team_ids_for(teams)
+    future = np.flatnonzero(~store.finished & (True if mask is None else mask))
+    home, away = remap[store.home[future]], remap[store.away[future]]
+    valid = (home >= 0) & (away >= 0)
+    return home[valid], away[valid], future[valid]
+
+TABLE_STATS = {'points': 'Punkte', 'goals': 'Tore', 'diff': 'Diff',
+               'wins': 'Siege', 'away_goals': 'Auswärtstore', 'away_wins': 'Auswärtssiege'}
+
+def _table_column(table, col):
+    """Spalte der Tabelle als float-Array (fehlende Spalte -> 0)."""
+    return table[col].to_numpy(dtype=float) if col in table.columns else np.zeros(len(table))
+
+def _draw_form_levels(rng, n_sims, model):
+    """Formstufe pro Simulation und Team (Teams ohne Statistik: neutrale Stufe)."""
+    levels = rng.integers(0, FORM_LEVELS, size=(n_sims, len(model['teams'])))
+    levels[:, ~model['has_stats']] = FORM_LEVELS // 2
+    return levels
+
+def _simulate_table_batch(model, levels, hg, ag, sim=None):
+    """
+    Endtabelle aller Simulationen (Punkte, Tore, Diff, ... als Simulationen x Teams) aus den
+    simulierten Ergebnissen der offenen Spiele plus aktuellem Stand, dazu die Formstärken.
+    sim: schon vorliegende Kennzahlen der simulierten Spiele (sonst aus hg/ag).
+    """
+    n_teams = len(model['teams'])
+    form = FORM_FACTORS[levels]
+    att = model['attack'] * form
+    dfn = model['defense'] * (2 - form)
+    if sim is None:
+        sim = tiebreakers.result_stats(n_teams, model['home_idx'], model['away_idx'], hg, ag, extended=model['tiebreak'] == 'uefa')
+    stats = {key: sim[key] + model['base'][key] for key in sim if key in model['base']}
+    return stats, att, dfn
+
+def _rank_batch(model, stats, hg, ag, teams=None):
+    """
+    Ranking pro Simulation nach den Tiebreak-Regeln des Wettbewerbs -> Matrix der Team-Indizes nach Platz.
+    Für den direkten Vergleich zählen die gespielten und die simulierten Spiele.
+    """
+    matches = None
+    if model['tiebreak'] == 'head_to_head':
+        matches = [model['played'], (model['home_idx'], model['away_idx'], hg, ag)]
+    return tiebreakers.rank_table(model['tiebreak'], stats, matches, teams)
+
+def _performance_boost_batch(points):
+    """Form-Boost wie in generate_cl_bracket: 1.0 + bis zu 0.2 Bonus relativ zum Punktbesten, pro Simulation."""
+    max_points = points.max(axis=1, keepdims=True)
+    max_points = np.where(max_points > 0, max_points, 1)
+    return 1.0 + (points / max_points) * 0.2
+
+def _simulate_games_batch(rng, t1, t2, att, dfn, avg_goals, home_advantage, boost, scale=1.0):
+    """
+    Ein Spiel pro Paarung (t1 Heim, t2 Gast); t1/t2 sind (Simulationen x Paarungen) Team-Indizes.
+    scale: Anteil der noch zu spielenden Zeit (0 = schon beendet, live anteilig).
+    """
+    rows = np.arange(t1.shape[0])[:, None]
+    lam1 = att[rows, t1] * dfn[rows, t2] * avg_goals * home_advantage * boost[rows, t1] * scale
+    lam2 = att[rows, t2] * dfn[rows, t1] * avg_goals * boost[rows, t2] * scale
+    return rng.poisson(lam1), rng.poisson(lam2)
+
+def _resolve_winner(rng, t1, t2, goals1, goals2):
+    """Sieger nach Toren/Aggregat, bei Gleichstand Elfmeterschießen (50/50)."""
+    penalties = rng.random(t1.shape) < 0.5
+    return np.where(goals1 > goals2, t1, np.where(goals2 > goals1, t2, np.where(penalties, t1, t2)))
+
+LEAGUE_STAGE = 'LEAGUE_STAGE'
+KNOCKOUT_ROUNDS = {'PLAYOFFS': 'Playoffs', 'LAST_16': 'Achtelfinale', 'QUARTER_FINALS': 'Viertelfinale',
+                   'SEMI_FINALS': 'Halbfinale', 'FINAL': 'Finale'} # API-Stage -> Runde
+
+def league_stage_mask(matches):
+    """Spiele der Ligaphase, falls der Wettbewerb eine hat (CL); sonst alle Spiele."""
+    store = as_match_store(matches)
+    mask = np.asarray(store.stage, dtype=object) == LEAGUE_STAGE
+    return mask if mask.any() else np.ones(len(store), dtype=bool)
+
+def league_phase(matches):
+    """Nur die Spiele der Ligaphase (siehe league_stage_mask), z.B. für die Tabelle der CL."""
+    store = as_match_store(matches)
+    return store.subset(league_stage_mask(store))
+
+def _open_ties(legs):
+    """Slots noch nicht ausgeloster Paarungen: Hinspiel bei t1, Rückspiel bei t2, noch keine Tore."""
+    return {'home_is_t1': np.array([[True, False][:legs]]), 'goals1': np.zeros((1, legs), dtype=np.int64),
+            'goals2': np.zeros((1, legs), dtype=np.int64), 'remaining': np.ones((1, legs))}
+
+def _encode_knockout(store, teams):
+    """
+    Schon bekannte K.O.-Paarungen pro Runde aus den Spielen mit K.O.-Stage (Teams als Indizes in teams).
+    Pro Paarung t1 (Heimteam des ersten Spiels) und t2, pro Spiel-Slot (Paarungen x Spiele) home_is_t1,
+    die schon gefallenen Tore goals1/goals2 (beendet oder aktueller Live-Stand) und remaining
+    (noch offene Spielzeit: 1 offen, 0 beendet, live anteilig). Ein noch nicht angesetztes Rückspiel
+    bekommt das getauschte Heimrecht.
+    """
+    remap = store.team_ids_for(teams)
+    home, away = remap[store.home], remap[store.away]
+    stage = np.asarray(store.stage, dtype=object)
+    ties = {}
+    for api_stage, r_name in KNOCKOUT_ROUNDS.items():
+        rows = np.flatnonzero((stage == api_stage) & (home >= 0) & (away >= 0))
+        if not len(rows): continue
+        pairs = {}
+        for row in rows[np.argsort(store.dates[rows], kind='stable')]:
+            pairs.setdefault(frozenset((home[row], away[row])), []).append(row)
+        legs = 1 if api_stage == 'FINAL' else 2
+        tie = _open_ties(legs)
+        tie = {key: np.repeat(values, len(pairs), axis=0) for key, values in tie.items()}
+        tie['t1'] = np.array([home[tie_rows[0]] for tie_rows in pairs.values()], dtype=np.int64)
+        tie['t2'] = np.array([away[tie_rows[0]] for tie_rows in pairs.values()], dtype=np.int64)
+        for i, tie_rows in enumerate(pairs.values()):
+            for j, row in enumerate(tie_rows[:legs]):
+                at_home = home[row] == tie['t1'][i]
+                tie['home_is_t1'][i, j] = at_home
+                if store.finished[row] or store.live[row]:
+                    goals = (store.home_goals[row], store.away_goals[row])
+                    tie['goals1'][i, j], tie['goals2'][i, j] = goals if at_home else goals[::-1]
+                    tie['remaining'][i, j] = 0.0 if store.finished[row] else max(MATCH_MINUTES - store.minute[row], 0) / MATCH_MINUTES
+        ties[r_name] = tie
+    return ties
+
+def _play_ties(rng, t1, t2, slots, att, dfn, avg_goals, boost, home_advantage):
+    """
+    Alle Spiele einer Runde auf einmal (t1/t2: Simulationen x Paarungen): pro Spiel-Slot die fehlenden Tore
+    würfeln, zu den schon gefallenen addieren, Sieger nach Gesamtergebnis.
+    Liefert (Sieger, Tore t1, Tore t2), Tore als (Simulationen x Paarungen x Slots).
+    """
+    shape = t1.shape + (slots['home_is_t1'].shape[-1],)
+    home_is_t1 = np.broadcast_to(slots['home_is_t1'], shape)
+    first, second = np.broadcast_to(t1[..., None], shape), np.broadcast_to(t2[..., None], shape)
+    home, away = np.where(home_is_t1, first, second), np.where(home_is_t1, second, first)
+    n = len(t1)
+    gh, ga = _simulate_games_batch(rng, home.reshape(n, -1), away.reshape(n, -1), att, dfn, avg_goals, home_advantage,
+                                   boost, np.broadcast_to(slots['remaining'], shape).reshape(n, -1))
+    gh, ga = gh.reshape(shape), ga.reshape(shape)
+    goals1 = slots['goals1'] + np.where(home_is_t1, gh, ga)
+    goals2 = slots['goals2'] + np.where(home_is_t1, ga, gh)
+    return _resolve_winner(rng, t1, t2, goals1.sum(axis=2), goals2.sum(axis=2)), goals1, goals2
+
+def _knockout_stage_batch(rng, r_name, current, pair, tie, legs, att, dfn, avg_goals, boost, home_advantage, games=None):
+    """
+    Eine K.O.-Runde für alle Simulationen (current: Teilnehmer als Simulationen x Teams).
+    Bekannte Paarungen (tie) laufen mit ihren echten Ergebnissen, die übrigen Teilnehmer paart
+    pair(current) -> (t1, t2). Liefert die Sieger als (Simulationen x Paarungen).
+    """
+    n = len(current)
+    parts = []
+    if tie is not None:
+        rest = ~np.isin(current, np.concatenate([tie['t1'], tie['t2']]))
+        # Nur wenn alle Teams der bekannten Paarungen in jeder Simulation dabei sind (sonst passt der Stand nicht zusammen)
+        if (rest.sum(axis=1) == current.shape[1] - 2 * len(tie['t1'])).all():
+            k = len(tie['t1'])
+            parts.append((np.broadcast_to(tie['t1'], (n, k)), np.broadcast_to(tie['t2'], (n, k)), tie))
+            current = current[rest].reshape(n, -1)
+    if current.shape[1]:
+        t1, t2 = pair(current)
+        parts.append((t1, t2, _open_ties(legs)))
+    winners = []
+    for t1, t2, slots in parts:
+        won, goals1, goals2 = _play_ties(rng, t1, t2, slots, att, dfn, avg_goals, boost, home_advantage)
+        winners.append(won)
+        if games is not None: games.append((r_name, t1, t2, goals1, goals2, slots['home_is_t1'], won))
+    return np.concatenate(winners, axis=1)
+
+CL_ROUNDS = ['Achtelfinale', 'Viertelfinale', 'Halbfinale', 'Finale', 'Titel']
+
+def simulate_cl_knockout_batch(rng, ranking, points, att, dfn, avg_goals, home_advantage=HOME_ADVANTAGE, ties=None, games=None):
+    """
+    Simuliert den kompletten K.O.-Teil (Playoffs 9-24, Achtelfinale bis Finale)
+    für viele Turniere gleichzeitig. Liefert pro Runde die erreichenden Teams
+    als (Simulationen x Teams) Matrix.
+    ties: schon bekannte Paarungen pro Runde (siehe _encode_knockout). Gespielte Spiele zählen mit
+    ihrem echten Ergebnis, gewürfelt werden nur fehlende Spiele bzw. die Restspielzeit laufender Spiele;
+    ausgeschiedene Teams kommen so nicht mehr weiter. Die übrigen Teilnehmer werden wie bisher gepaart.
+    games: Liste, die pro Runde (Runde, t1, t2, Tore t1, Tore t2, home_is_t1, Sieger) aufnimmt (Anzeige).
+    """
+    ties = ties or {}
+    boost = _performance_boost_batch(points)
+    reached = {}
+    halves = lambda c: (c[:, :c.shape[1] // 2], c[:, c.shape[1] // 2:])
+    def drawn(c):
+        c = rng.permuted(c, axis=1)
+        return c[:, 0::2], c[:, 1::2]
+    play = lambda r_name, current, pair, legs=2, home_adv=home_advantage: _knockout_stage_batch(
+        rng, r_name, current, pair, ties.get(r_name), legs, att, dfn, avg_goals, boost, home_adv, games)
+
+    # A) Playoffs: Platz 17-24 empfängt zuerst Platz 9-16
+    playoff_winners = play('Playoffs', ranking[:, 8:24], lambda c: halves(c)[::-1])
+
+    # B) Achtelfinale: Top 8 gesetzt vs. zugeloste Playoff-Sieger, danach frei gelost
+    current = np.concatenate([rng.permuted(playoff_winners, axis=1), ranking[:, 0:8]], axis=1)
+    for r_name in CL_ROUNDS:
+        reached[r_name] = current
+        if r_name == 'Titel':
+            break
+        if r_name == 'Finale':
+            current = play(r_name, current, drawn, legs=1, home_adv=1.0) # Ein Spiel, neutraler Ort
+        else:
+            current = play(r_name, current, halves if r_name == 'Achtelfinale' else drawn)
+    return reached
+
+SIM_BATCH_SIZE = 5000 # Begrenzt den Speicher pro Batch (Sims x Spiele Arrays)
+SIM_SHARD_SIZE = 5000 # Feste Shard-Größe: gleiche Seeds -> gleiche Ergebnisse, egal wo die Shards laufen
+
+CL_COLUMNS = ['Titel', 'Top8', 'Playoff', 'Achtelfinale', 'Viertelfinale', 'Halbfinale', 'Finale', 'Out', 'TotalPoints']
+LEAGUE_COLUMNS = ['Meister', 'CL', 'EL', 'ConfL', 'Abstieg', 'TotalPoints']
+
+def _all_teams_active(model):
+    """Standard ohne Pruning: alle Teams simuliert, Schwellen nach Tabellenplatz."""
+    n_teams = len(model['teams'])
+    model['active'] = np.arange(n_teams)
+    model['pinned'] = {}
+    model['expected_skipped_points'] = np.zeros(n_teams)
+    model['thresholds'] = {'Meister': 1, 'CL': 4, 'Abstieg': n_teams - 3 if n_teams >= 18 else None}
+    return model
+
+def decided_top_k(base_points, max_points, k):
+    """
+    Exakte (konservative) Entscheidung für "unter den ersten k" per Max-Punkte-Schranke:
+    clinched = weniger als k andere Teams können die eigenen Punkte noch erreichen,
+    eliminated = mindestens k Teams haben schon jetzt mehr Punkte als man selbst maximal holen kann.
+    Gleichstände zählen als offen.
+    """
+    can_reach = (max_points[None, :] >= base_points[:, None]).sum(axis=1) - 1 # ohne sich selbst
+    surely_above = (base_points[None, :] > max_points[:, None]).sum(axis=1)
+    return can_reach < k, surely_above >= k
+
+def prune_decided_teams(model):
+    """
+    Entfernt Teams, deren Ausgang für ALLE Schwellen (Meister, CL, Abstieg) feststeht, aus der Monte-Carlo.
+    Ihre Wahrscheinlichkeiten werden auf 0/100% fixiert, die Schwellen der übrigen Teams entsprechend
+    verschoben, und Spiele zwischen zwei entschiedenen Teams werden nicht mehr simuliert
+    (ihre Punkte fließen nur als Erwartungswert in AvgPoints ein).
+    Beim CL-Format hängt der K.O.-Teil an allen Teams, dort wird nichts entfernt.
+    """
+    model = _all_teams_active(model)
+    n_teams = len(model['teams'])
+    if model['is_cl'] or n_teams == 0: return model
+
+    home_idx, away_idx = model['home_idx'], model['away_idx']
+    remaining = np.bincount(home_idx, minlength=n_teams) + np.bincount(away_idx, minlength=n_teams)
+    max_points = model['base_points'] + 3 * remaining
+
+    decided = np.ones(n_teams, dtype=bool)
+    status = {}
+    for col, k in model['thresholds'].items():
+        if k is None: continue
+        clinched, eliminated = decided_top_k(model['base_points'], max_points, k)
+        status[col] = (clinched, eliminated)
+        decided &= clinched | eliminated
+    if not decided.any(): return model
+
+    # Schwellen verschieben: jedes entfernte Team, das sicher über der Schwelle liegt, belegt einen Platz
+    for col, (clinched, eliminated) in status.items():
+        model['thresholds'][col] -= int((clinched & decided).sum())
+    model['pinned'] = {
+        'Meister': (status['Meister'][0] & decided).astype(float),
+        'CL': (status['CL'][0] & decided).astype(float),
+    }
+    if 'Abstieg' in status:
+        model['pinned']['Abstieg'] = (status['Abstieg'][1] & decided).astype(float)
+
+    # Nur noch Spiele mit mindestens einem offenen Team simulieren
+    keep = ~decided[home_idx] | ~decided[away_idx]
+    skip_h, skip_a = home_idx[~keep], away_idx[~keep]
+    summary = model['score_summary']
+    skipped = model['fixture_pos'][~keep]
+    exp_h = 3 * summary['1'][skipped] + summary['X'][skipped]
+    exp_a = 3 * summary['2'][skipped] + summary['X'][skipped]
+    model['expected_skipped_points'] = (np.bincount(skip_h, weights=exp_h, minlength=n_teams) +
+                                        np.bincount(skip_a, weights=exp_a, minlength=n_teams))
+    model['home_idx'], model['away_idx'] = home_idx[keep], away_idx[keep]
+    model['fixture_pos'] = model['fixture_pos'][keep]
+    model['active'] = np.flatnonzero(~decided)
+    metrics.incr('pruned_teams', int(decided.sum()))
+    metrics.incr('pruned_fixtures', int((~keep).sum()))
+    return model
+
+def _encode_played(store, teams, mask=None):
+    """Beendete Spiele zwischen Tabellen-Teams als (home, away, hg, ag), Tore als (1 x Spiele) für den direkten Vergleich."""
+    remap = store.team_ids_for(teams)
+    done = np.flatnonzero(store.finished & (True if mask is None else mask))
+    home, away = remap[store.home[done]], remap[store.away[done]]
+    valid = (home >= 0) & (away >= 0)
+    done = done[valid]
+    return (home[valid], away[valid], store.home_goals[done].astype(np.int64)[None, :],
+            store.away_goals[done].astype(np.int64)[None, :])
+
+def build_season_model(matches, current_table, is_cl=False, prune=True, history=None, tiebreak=None):
+    """
+    Alles, was die Monte-Carlo braucht, als reine NumPy-Arrays (picklebar für Worker-Prozesse).
+    Mit prune werden bereits entschiedene Teams/Spiele vorab aussortiert (siehe prune_decided_teams).
+    tiebreak: Regel aus tiebreakers.TIEBREAK_RULES (Standard: UEFA für die CL, sonst Tordifferenz).
+    Simuliert werden nur offene Spiele der Ligaphase (current_table also ohne K.O.-Spiele, siehe league_phase),
+    beim CL-Format kommen die bekannten K.O.-Paarungen als knockout dazu.
+    """
     if not current_table.empty:
         current_table = current_table[current_table.index.notna() & (current_table.index != "")]
 
-    stats, avg_goals = calculate_smart_strengths(df_matches)
-    future = df_matches[df_matches['Finished'] == False]
-    
-    if is_cl:
-        results = {team: {'Titel': 0, 'Top8': 0, 'Playoff': 0, 'Out': 0, 'TotalPoints': 0} for team in current_table.index}
+    store = as_match_store(matches)
+    teams = current_table.index.tolist()
+    attack, defense, has_stats, avg_goals = _table_aligned_strengths(teams, store, history)
+    in_league = league_stage_mask(store)
+    home_idx, away_idx, rows = _encode_fixtures(store, teams, in_league)
+    n_teams = len(teams)
+    fit = fit_team_model(store, history)
+    score_table = fixture_score_table(store, history)
+
+    tiebreak = tiebreak or ('uefa' if is_cl else tiebreakers.DEFAULT_TIEBREAK)
+
+    model = {
+        'teams': teams, 'is_cl': is_cl, 'avg_goals': avg_goals, 'tiebreak': tiebreak,
+        'home_advantage': fit['home_advantage'], 'rho': fit['rho'],
+        'attack': attack, 'defense': defense, 'has_stats': has_stats,
+        'home_idx': home_idx, 'away_idx': away_idx,
+        'fixture_pos': score_table['position'][rows], 'score_summary': score_table['summary'],
+        'score_table': score_table,
+        'base': {key: _table_column(current_table, col) for key, col in TABLE_STATS.items()},
+        'played': _encode_played(store, teams, in_league) if tiebreak == 'head_to_head' else None,
+        'knockout': _encode_knockout(store, teams) if is_cl else {},
+    }
+    model['base_points'] = model['base']['points']
+    model = prune_decided_teams(model) if prune else _all_teams_active(model)
+    # Nur die Verteilungen der tatsächlich simulierten Spiele gehen (gepickelt) an die Worker
+    model['score_sampler'] = score_sampler(model.pop('score_table'), model['fixture_pos'])
+    return model
+
+def _count_places(counts, col, teams, n_teams, flags=None):
+    """Zählt, wie oft jedes Team in teams (Simulationen x Plätze) vorkommt; mit flags zusätzlich pro Simulation."""
+    counts[col] += np.bincount(teams.ravel(), minlength=n_teams)
+    if flags is not None:
+        hit = np.zeros((len(teams), n_teams), dtype=bool)
+        hit[np.arange(len(teams))[:, None], teams] = True
+        flags[col] = hit
+
+def _tally_batch(model, counts, levels, hg, ag, rng, sim=None, flags=None):
+    """
+    Zählt Platzierungen (beim CL-Format inkl. K.O.-Teil) eines Batches simulierter Rest-Saisons in counts.
+    flags: Dict, das pro Spalte die (Simulationen x Teams) Treffer aufnimmt (ohne fixierte Teams), z.B. für Szenarien.
+    """
+    n, n_teams = len(levels), len(model['teams'])
+    stats, att, dfn = _simulate_table_batch(model, levels, hg, ag, sim)
+    points = stats['points']
+    counts['TotalPoints'] += points.sum(axis=0) + n * model['expected_skipped_points']
+
+    if model['is_cl']:
+        ranking = _rank_batch(model, stats, hg, ag)
+        _count_places(counts, 'Top8', ranking[:, 0:8], n_teams, flags)
+        _count_places(counts, 'Playoff', ranking[:, 8:24], n_teams, flags)
+        _count_places(counts, 'Out', ranking[:, 24:], n_teams, flags)
+        if n_teams >= 24:
+            # Echtes Turnier: Playoffs bis Finale für jede Simulation
+            reached = simulate_cl_knockout_batch(rng, ranking, points, att, dfn, model['avg_goals'], model['home_advantage'],
+                                                 model['knockout'])
+            for r_name, r_teams in reached.items():
+                _count_places(counts, r_name, r_teams, n_teams, flags)
+        else:
+            # Zu wenige Teams für das K.O.-Format: Platz 1 als Proxy
+            _count_places(counts, 'Titel', ranking[:, :1], n_teams, flags)
     else:
-        results = {team: {'Meister': 0, 'CL': 0, 'EL': 0, 'ConfL': 0, 'Abstieg': 0, 'TotalPoints': 0} for team in current_table.index}
-    
-    for _ in range(n_simulations):
-        sim_table = current_table.copy()
-        current_sim_stats = {}
-        for team, values in stats.items():
-            form_factor = np.random.normal(1.0, 0.10)
-            current_sim_stats[team] = {'attack': values['attack']*form_factor, 'defense': values['defense']*(2-form_factor)}
-        
-        for _, match in future.iterrows():
-            h, a = match['HomeTeam'], match['AwayTeam']
-            if not h or not a: continue
-            h_s = current_sim_stats.get(h, {'attack': 1, 'defense': 1})
-            a_s = current_sim_stats.get(a, {'attack': 1, 'defense': 1})
-            hg = np.random.poisson(h_s['attack'] * a_s['defense'] * avg_goals * 1.2)
-            ag = np.random.poisson(a_s['attack'] * h_s['defense'] * avg_goals)
-            if hg > ag: sim_table.loc[h, 'Punkte'] += 3
-            elif ag > hg: sim_table.loc[a, 'Punkte'] += 3
-            else: sim_table.loc[h, 'Punkte'] += 1; sim_table.loc[a, 'Punkte'] += 1
-        
-        for team in sim_table.index: results[team]['TotalPoints'] += sim_table.loc[team, 'Punkte']
-        ranking = sim_table.sort_values(by=['Punkte', 'Diff', 'Tore'], ascending=False).index.tolist()
-        
-        if is_cl:
-            # Einfache Zählung für Statistik
-            for t in ranking[0:8]: results[t]['Top8'] += 1
-            for t in ranking[8:24]: results[t]['Playoff'] += 1
-            # Titelchance simulieren wir hier vereinfacht über Tabellenplatz 1 als Proxy für Favoriten
-            # Echte KO Simulation ist zu teuer für 500 Runs, dafür haben wir generate_cl_bracket
-            results[ranking[0]]['Titel'] += 1 
+        # Nur offene Teams ranken, Schwellen sind um bereits entschiedene Teams verschoben
+        active = model['active']
+        ranking = _rank_batch(model, stats, hg, ag, teams=active)
+        th = model['thresholds']
+        _count_places(counts, 'Meister', ranking[:, :th['Meister']], n_teams, flags)
+        _count_places(counts, 'CL', ranking[:, :th['CL']], n_teams, flags)
+        if th['Abstieg'] is not None:
+            _count_places(counts, 'Abstieg', ranking[:, th['Abstieg']:], n_teams, flags)
+        for col, pinned in model['pinned'].items():
+            counts[col] += n * pinned
+
+def _empty_counts(model):
+    return {col: np.zeros(len(model['teams'])) for col in (CL_COLUMNS if model['is_cl'] else LEAGUE_COLUMNS)}
+
+def simulate_season_shard(model, n_sims, rng):
+    """
+    Ein unabhängiger Shard der Saison-Simulation mit eigenem Zufalls-Stream.
+    Jede Simulation würfelt pro Team eine Formstufe, die Ergebnisse aller Spiele kommen dann
+    per Inverse-CDF aus der vorberechneten Ergebnistabelle (eine Gleichverteilte pro Spiel).
+    Liefert Zählungen (nicht Prozente), damit Shards einfach addiert werden können.
+    """
+    rng = as_generator(rng)
+    counts = _empty_counts(model)
+
+    done = 0
+    while done < n_sims and len(model['teams']):
+        n = min(SIM_BATCH_SIZE, n_sims - done)
+        levels = _draw_form_levels(rng, n, model)
+        hg, ag = sample_scores(rng, model['score_sampler'], levels[:, model['home_idx']], levels[:, model['away_idx']])
+        _tally_batch(model, counts, levels, hg, ag, rng)
+        done += n
+    return counts
+
+def _shard_sizes(n_simulations):
+    sizes = [SIM_SHARD_SIZE] * (n_simulations // SIM_SHARD_SIZE)
+    if n_simulations % SIM_SHARD_SIZE: sizes.append(n_simulations % SIM_SHARD_SIZE)
+    return sizes
+
+def _as_seed_source(seed):
+    """Generator/SeedSequence bleiben, int/None wird zur SeedSequence (spawn liefert bei jedem Aufruf neue Streams)."""
+    if isinstance(seed, (np.random.Generator, np.random.SeedSequence)): return seed
+    return np.random.SeedSequence(seed)
+
+def run_season_shards(model, n_simulations, seed=None, executor=None):
+    """
+    Teilt n_simulations in Shards fester Größe mit eigenen Kind-Streams (spawn) auf.
+    seed darf None, int, SeedSequence oder Generator sein.
+    Mit executor (z.B. ProcessPoolExecutor) laufen die Shards parallel, die Zählungen werden summiert.
+    """
+    shard_sizes = _shard_sizes(n_simulations)
+    streams = spawn_generators(seed, len(shard_sizes))
+
+    if executor is None:
+        shard_counts = [simulate_season_shard(model, n, s) for n, s in zip(shard_sizes, streams)]
+    else:
+        futures = [executor.submit(simulate_season_shard, model, n, s) for n, s in zip(shard_sizes, streams)]
+        shard_counts = [f.result() for f in futures]
+
+    counts = _empty_counts(model)
+    for shard in shard_counts:
+        for col in counts: counts[col] += shard[col]
+    return counts
+
+def max_standard_error(counts, n_simulations):
+    """Größter Standardfehler (in Prozentpunkten) aller angezeigten Wahrscheinlichkeiten."""
+    worst = 0.0
+    for col, values in counts.items():
+        if col == 'TotalPoints' or not len(values): continue
+        p = values / n_simulations
+        worst = max(worst, float(np.sqrt(p * (1 - p) / n_simulations).max()) * 100)
+    return worst
+
+def run_season_adaptive(model, batch_size, tolerance, time_budget=None, max_simulations=None, seed=None, executor=None):
+    """
+    Simuliert in Batches, bis der Standardfehler jeder Wahrscheinlichkeit unter tolerance
+    (Prozentpunkte) liegt, das Zeitbudget (s) aufgebraucht ist oder max_simulations erreicht sind.
+    Liefert (counts, n_simulations, max_standard_error).
+    """
+    seed_source = _as_seed_source(seed)
+    start = time.perf_counter()
+    counts, n_done, std_error = None, 0, float('inf')
+    while True:
+        n = batch_size if max_simulations is None else min(batch_size, max_simulations - n_done)
+        if n <= 0: break
+        batch = run_season_shards(model, n, seed=seed_source, executor=executor)
+        counts = batch if counts is None else {col: counts[col] + batch[col] for col in counts}
+        n_done += n
+        std_error = max_standard_error(counts, n_done)
+        if std_error <= tolerance: break
+        if time_budget is not None and time.perf_counter() - start >= time_budget: break
+    return counts, n_done, std_error
+
+def simulate_season(matches, current_table, n_simulations=500, is_cl=False, seed=None, executor=None,
+                    tolerance=None, time_budget=None, max_simulations=None, history=None, tiebreak=None):
+    """
+    Monte-Carlo der Rest-Saison, vollständig vektorisiert.
+    Teams und Spiele werden als Integer-Arrays kodiert, die Punkte landen in einer
+    (Simulationen x Teams) Matrix. Mit executor laufen die Shards in Worker-Prozessen.
+
+    Mit tolerance (Prozentpunkte) läuft die Simulation adaptiv in Batches zu n_simulations,
+    bis alle Wahrscheinlichkeiten genau genug sind (oder time_budget/max_simulations greifen).
+    Erreichte Genauigkeit steht in df.attrs ('n_simulations', 'std_error').
+    history: Vorsaisons für das Stärkemodell (siehe calculate_strength_arrays).
+    tiebreak: Tiebreak-Regel des Wettbewerbs (siehe tiebreakers.TIEBREAK_RULES).
+    """
+    with metrics.span('strengths'):
+        model = build_season_model(matches, current_table, is_cl, history=history, tiebreak=tiebreak)
+    with metrics.span('monte_carlo'):
+        if tolerance is None:
+            counts = run_season_shards(model, n_simulations, seed=seed, executor=executor)
+            std_error = max_standard_error(counts, n_simulations) if n_simulations else float('inf')
         else:
-            if ranking: results[ranking[0]]['Meister'] += 1
-            for t in ranking[0:4]: results[t]['CL'] += 1
-            if len(ranking) >= 18:
-                for t in ranking[-3:]: results[t]['Abstieg'] += 1
+            counts, n_simulations, std_error = run_season_adaptive(model, n_simulations, tolerance, time_budget,
+                                                                    max_simulations, seed=seed, executor=executor)
+    metrics.incr('simulations_run', n_simulations)
+    return _counts_frame(model, counts, n_simulations, std_error)
 
-    df_res = pd.DataFrame.from_dict(results, orient='index')
+def _counts_frame(model, counts, n_simulations, std_error):
+    """Zählungen -> Prozente/AvgPoints pro Team, sortiert nach AvgPoints, Genauigkeit in attrs."""
+    df_res = pd.DataFrame(counts, index=model['teams'])
     df_res['AvgPoints'] = df_res['TotalPoints'] / n_simulations
     for col in df_res.columns:
         if col != 'AvgPoints': df_res[col] = (df_res[col] / n_simulations) * 100
-        
-    return df_res.sort_values(by='AvgPoints', ascending=False)
-
-def predict_upcoming_matches(df_matches, next_n=9):
-    # (Bleibt unverändert wie zuvor)
-    stats, avg_goals = calculate_smart_strengths(df_matches)
-    if 'Date' in df_matches.columns:
-        future = df_matches[df_matches['Finished'] == False].dropna(subset=['HomeTeam', 'AwayTeam']).sort_values(by='Date').head(next_n)
-    else: return pd.DataFrame()
-    
-    predictions = []
-    def poisson_prob(k, lam): return (lam**k * np.exp(-lam)) / math.factorial(k)
-
-    for _, match in future.iterrows():
-        h, a = match['HomeTeam'], match['AwayTeam']
-        h_s = stats.get(h, {'attack': 1, 'defense': 1})
-        a_s = stats.get(a, {'attack': 1, 'defense': 1})
-        lam_h = h_s['attack'] * a_s['defense'] * avg_goals * 1.2
-        lam_a = a_s['attack'] * h_s['defense'] * avg_goals
-        
-        probs = np.zeros((10, 10))
-        for i in range(10):
-            for j in range(10):
-                probs[i][j] = poisson_prob(i, lam_h) * poisson_prob(j, lam_a)
-        
-        p1 = np.sum(np.tril(probs, -1))
-        px = np.trace(probs)
-        p2 = np.sum(np.triu(probs, 1))
-        
-        idx = np.unravel_index(np.argmax(probs), probs.shape)
-        predictions.append({'Datum': match['Date'], 'Heim': h, 'Auswärts': a, 'Tipp': f"{idx[0]}:{idx[1]}", '1': p1*100, 'X': px*100, '2': p2*100})
-    return pd.DataFrame(predictions)
\ No newline at end of file
+
+    df_res = df_res.sort_values(by='AvgPoints', ascending=False)
+    df_res.attrs['n_simulations'] = n_simulations
+    df_res.attrs['std_error'] = std_error
+    return df_res
+
+# --- INKREMENTELLE SIMULATION (GEMEINSAME ZUFALLSZAHLEN) ---
+INCREMENTAL_SIMULATIONS = 40000 # Standardfehler jeder Wahrscheinlichkeit <= 0.25 %-Pkt.
+INCREMENTAL_TOLERANCE = 0.005   # Gespeicherte Ergebnisse eines Spiels bleiben, solange sich 1/X/2 um höchstens 0.5 %-Pkt. bewegt
+_CRN_SCORES, _CRN_FORM, _CRN_KNOCKOUT = 0, 1, 2 # Getrennte Zufalls-Domänen
+STORED_GOALS_MAX = 15 # Gespeicherte Ergebnisse: Heim- und Gasttore je 4 Bit in einem Byte (mehr Tore praktisch nie)
+
+def stable_key(*names):
+    """Stabile 63-Bit-ID aus Namen (unabhängig von Prozess und PYTHONHASHSEED), z.B. als Saison-Seed."""
+    return int.from_bytes(hashlib.sha1("|".join(map(str, names)).encode()).digest()[:8], 'big') >> 1
+
+def crn_uniforms(seed, block, keys, n_sims, domain=_CRN_SCORES):
+    """
+    Common Random Numbers: Gleichverteilte als (n_sims x Schlüssel) für einen Block von Simulationen.
+    Spalte j hängt nur von (seed, block, keys[j]) ab, dieselbe Paarung (bzw. dasselbe Team) zieht
+    also bei jedem Refresh dieselben Zahlen, egal welche anderen Spiele inzwischen beendet sind.
+    """
+    out = np.empty((n_sims, len(keys)))
+    for j, key in enumerate(keys):
+        out[:, j] = np.random.default_rng([seed, block, int(key), domain]).random(n_sims)
+    return out
+
+def _sim_blocks(n_simulations):
+    """(Block-Nummer, Slice) der Simulationen in Blöcken à SIM_SHARD_SIZE."""
+    return [(b, slice(b * SIM_SHARD_SIZE, min((b + 1) * SIM_SHARD_SIZE, n_simulations)))
+            for b in range(-(-n_simulations // SIM_SHARD_SIZE))]
+
+def _crn_form_levels(model, team_keys, seed, n_simulations, teams=None):
+    """Formstufen wie _draw_form_levels, aber pro Team aus dessen festen Zufallszahlen (teams: nur diese Team-Indizes)."""
+    teams = np.arange(len(team_keys)) if teams is None else np.asarray(teams, dtype=np.int64)
+    levels = np.empty((n_simulations, len(teams)), dtype=np.int8)
+    for block, rows in _sim_blocks(n_simulations):
+        u = crn_uniforms(seed, block, team_keys[teams], rows.stop - rows.start, _CRN_FORM)
+        levels[rows] = np.minimum(u * FORM_LEVELS, FORM_LEVELS - 1)
+    levels[:, ~model['has_stats'][teams]] = FORM_LEVELS // 2
+    return levels
+
+def _resolve_block(sampler, seed, block, keys, level_h, level_a):
+    """Würfelt die Spiele keys für einen Simulations-Block mit ihren festen Zufallszahlen aus (läuft auch im Worker)."""
+    u = crn_uniforms(seed, block, keys, len(level_h))
+    hg, ag = sample_scores(None, sampler, level_h, level_a, u=u)
+    return np.minimum(hg, STORED_GOALS_MAX).astype(np.int8), np.minimum(ag, STORED_GOALS_MAX).astype(np.int8)
+
+def _pack_goals(hg, ag):
+    """Ergebnisse (Simulationen x Spiele) -> ein Byte pro Ergebnis, Heimtore im oberen Halbbyte."""
+    return (hg.astype(np.uint8) << 4) | ag.astype(np.uint8)
+
+def _unpack_goals(goals):
+    """Umkehrung von _pack_goals -> (hg, ag) als int8."""
+    return (goals >> 4).astype(np.int8), (goals & 0x0F).astype(np.int8)
+
+def _tally_block(model, seed, block, levels, hg, ag, sim):
+    """Zählungen und Treffer pro Simulation eines Blocks aus den gespeicherten Ergebnissen (läuft auch im Worker)."""
+    counts, flags = _empty_counts(model), {}
+    _tally_batch(model, counts, levels, hg, ag, np.random.default_rng([seed, block, 0, _CRN_KNOCKOUT]), sim, flags)
+    return counts, flags
+
+def _tally_state(model, state, levels, hg, ag, stats, executor=None):
+    """Zählt alle Simulationen des states blockweise (optional im executor). Liefert (counts, flags)."""
+    counts = _empty_counts(model)
+    tally_model = {key: value for key, value in model.items() if key != 'score_sampler'} # Tabelle wird nicht mehr gebraucht
+    args = [(tally_model, state['seed'], block, levels[rows], hg[rows], ag[rows],
+             {key: values[rows] for key, values in stats.items()})
+            for block, rows in _sim_blocks(state['n'])] if len(model['teams']) else []
+    if not args: return counts, {}
+    results = (executor.map(_tally_block, *zip(*args)) if executor is not None
+               else (_tally_block(*a) for a in args))
+    block_flags = []
+    for block_counts, flags in results:
+        for col in counts: counts[col] += block_counts[col]
+        block_flags.append(flags)
+    # Treffer bitweise gepackt (Simulationen/8 x Teams): der Zustand liegt dauerhaft im Ergebnis-Cache
+    return counts, {col: np.packbits(np.concatenate([f[col] for f in block_flags]), axis=0) for col in block_flags[0]}
+
+def _season_keys(model):
+    teams = model['teams']
+    team_keys = np.array([stable_key(t) for t in teams], dtype=np.int64)
+    fixture_keys = np.array([stable_key(teams[h], teams[a]) for h, a in zip(model['home_idx'], model['away_idx'])],
+                            dtype=np.int64)
+    return team_keys, fixture_keys
+
+def _state_table_stats(model, home, away, hg, ag):
+    """
+    Tabellen-Kennzahlen (nur der simulierte Teil) der Spiele home/away pro Simulation als int16,
+    blockweise berechnet, damit die Index-Arrays klein bleiben.
+    """
+    n_simulations, n_teams = len(hg), len(model['teams'])
+    extended = model['tiebreak'] == 'uefa'
+    keys = [key for key in ('points', 'goals', 'diff', 'wins', 'away_goals', 'away_wins') if extended or key in ('points', 'goals', 'diff')]
+    out = {key: np.zeros((n_simulations, n_teams), dtype=np.int16) for key in keys}
+    for _, rows in _sim_blocks(n_simulations):
+        sim = tiebreakers.result_stats(n_teams, home, away, hg[rows], ag[rows], extended)
+        for key in keys: out[key][rows] = sim[key]
+    return out
+
+def _narrow_stats(stats, home, away, n_teams):
+    """
+    Kennzahlen auf int8 verkleinern, wo sie bei den höchstens max_games simulierten Spielen pro Team
+    sicher hineinpassen (Punkte/Siege fast immer, Tore/Differenz ab ~8 offenen Spielen, z.B. CL).
+    """
+    max_games = int(np.bincount(np.concatenate([home, away]), minlength=n_teams).max()) if len(home) else 0
+    per_game = {'points': 3, 'wins': 1, 'away_wins': 1}
+    return {key: values.astype(np.int8 if max_games * per_game.get(key, STORED_GOALS_MAX) <= np.iinfo(np.int8).max
+                               else np.int16, copy=False)
+            for key, values in stats.items()}
+
+def update_season_state(model, state=None, n_simulations=INCREMENTAL_SIMULATIONS, seed=0, executor=None):
+    """
+    Bringt die gespeicherten Simulationsergebnisse (state) auf den Stand von model.
+    Inzwischen beendete Spiele fallen heraus (ihr echtes Ergebnis steckt schon im Tabellenstand),
+    offene Spiele behalten ihre simulierten Ergebnisse, solange sich ihre 1/X/2-Verteilung seit dem
+    Auswürfeln um höchstens INCREMENTAL_TOLERANCE bewegt hat. Nur neue oder spürbar veränderte Spiele
+    werden neu ausgewürfelt, mit denselben Zufallszahlen wie zuvor (crn_uniforms).
+    Die Tabellen-Kennzahlen pro Simulation werden ebenfalls nur um die geänderten Spiele korrigiert,
+    ein Update mit wenigen geänderten Spielen (z.B. live) kostet so kaum mehr als das Ranking.
+    Ohne (passenden) state wird alles ausgewürfelt. Liefert (state, levels, hg, ag); der alte state bleibt unverändert.
+    Gespeichert werden nur die gepackten Ergebnisse (goals) und schmale Kennzahlen: Formstufen lassen sich
+    aus den festen Zufallszahlen jederzeit neu ziehen (~10-25 ms). Gemessen: ~15-19 MB pro Liga zum
+    Saisonstart (40.000 Simulationen), alle sechs Ligen zusammen ~100 MB.
+    """
+    team_keys, fixture_keys = _season_keys(model)
+    home_idx, away_idx, has_stats = model['home_idx'], model['away_idx'], model['has_stats']
+    n_fixtures = len(fixture_keys)
+    summary = model['score_summary']
+    outlook = (np.column_stack([summary[k][model['fixture_pos']] for k in ('1', 'X', '2')]) if n_fixtures
+               else np.zeros((0, 3)))
+    hg = np.zeros((n_simulations, n_fixtures), dtype=np.int8)
+    ag = np.zeros((n_simulations, n_fixtures), dtype=np.int8)
+    resolve = np.ones(n_fixtures, dtype=bool)
+    table_stats = None
+
+    if (state is not None and state['seed'] == seed and state['n'] == n_simulations
+            and state['version'] == MODEL_VERSION and state['tiebreak'] == model['tiebreak']):
+        old_col = {key: i for i, key in enumerate(state['fixture_keys'])}
+        old_stats = dict(zip(state['team_keys'], state['has_stats']))
+        cols = np.array([old_col.get(key, -1) for key in fixture_keys], dtype=np.int64)
+        # Wechselt ein Team von "ohne" zu "mit Statistik", ändern sich seine Formstufen -> seine Spiele neu
+        same_form = np.array([old_stats.get(key) == flag for key, flag in zip(team_keys, has_stats)], dtype=bool)
+        known = cols >= 0
+        drift = np.full(n_fixtures, np.inf)
+        drift[known] = np.abs(outlook[known] - state['outlook'][cols[known]]).max(axis=1)
+        resolve = (drift > INCREMENTAL_TOLERANCE) | ~same_form[home_idx] | ~same_form[away_idx]
+        keep = np.flatnonzero(~resolve)
+        hg[:, keep], ag[:, keep] = _unpack_goals(state['goals'][:, cols[keep]])
+        outlook[keep] = state['outlook'][cols[keep]] # Referenz bleibt die Verteilung beim Auswürfeln
+        metrics.incr('incremental_reused_fixtures', len(keep))
+
+        # Kennzahlen in die neue Team-Reihenfolge, Beiträge aller nicht übernommenen Spiele abziehen
+        new_pos = {key: i for i, key in enumerate(team_keys)}
+        old_to_new = np.array([new_pos.get(key, -1) for key in state['team_keys']], dtype=np.int64)
+        dropped = np.setdiff1d(np.arange(len(state['fixture_keys'])), cols[keep])
+        if (old_to_new >= 0).all() and len(dropped) + resolve.sum() < n_fixtures: # Sonst ist Neuberechnen billiger
+            old_teams = old_to_new[state['fixture_teams'][dropped]]
+            minus = _state_table_stats(model, old_teams[:, 0], old_teams[:, 1], *_unpack_goals(state['goals'][:, dropped]))
+            table_stats = {}
+            for key, values in minus.items():
+                table_stats[key] = np.zeros_like(values)
+                table_stats[key][:, old_to_new] = state['stats'][key]
+                table_stats[key] -= values
+
+    levels = _crn_form_levels(model, team_keys, seed, n_simulations)
+    todo = np.flatnonzero(resolve)
+    if len(todo):
+        sampler = score_sampler(model['score_sampler'], todo)
+        blocks = _sim_blocks(n_simulations)
+        args = [(sampler, seed, block, fixture_keys[todo], levels[rows][:, home_idx[todo]], levels[rows][:, away_idx[todo]])
+                for block, rows in blocks]
+        results = (executor.map(_resolve_block, *zip(*args)) if executor is not None
+                   else (_resolve_block(*a) for a in args))
+        for (_, rows), (block_hg, block_ag) in zip(blocks, results):
+            hg[rows, todo], ag[rows, todo] = block_hg, block_ag
+        metrics.incr('incremental_resolved_fixtures', len(todo))
+
+    if table_stats is None:
+        table_stats = _state_table_stats(model, home_idx, away_idx, hg, ag)
+    elif len(todo):
+        plus = _state_table_stats(model, home_idx[todo], away_idx[todo], hg[:, todo], ag[:, todo])
+        for key in table_stats: table_stats[key] += plus[key]
+
+    state = {'seed': seed, 'n': n_simulations, 'version': MODEL_VERSION, 'tiebreak': model['tiebreak'],
+             'team_keys': team_keys, 'has_stats': has_stats.copy(),
+             'fixture_keys': fixture_keys, 'fixture_teams': np.column_stack([home_idx, away_idx]),
+             'outlook': outlook, 'goals': _pack_goals(hg, ag),
+             'stats': _narrow_stats(table_stats, home_idx, away_idx, len(model['teams']))}
+    return state, levels, hg, ag
+
+def simulate_season_incremental(matches, current_table, state=None, n_simulations=INCREMENTAL_SIMULATIONS, is_cl=False,
+                                seed=0, executor=None, history=None, tiebreak=None):
+    """
+    Monte-Carlo der Rest-Saison, die auf der vorigen Simulation (state) aufsetzt.
+    Alle Zufallszahlen hängen nur am Saison-Seed und an der Paarung bzw. dem Team (Common Random
+    Numbers): zwischen zwei Refreshs bewegen sich die Wahrscheinlichkeiten also nur durch echte
+    Ergebnisse und Stärke-Updates, nicht durch Sampling-Rauschen. Neu ausgewürfelt werden nur
+    Spiele, die neu sind oder deren Verteilung sich spürbar bewegt hat (siehe update_season_state),
+    die Stärken kommen als Warmstart-Update des letzten Fits (fit_team_model).
+    Ein Live-Update mit 40.000 Simulationen kostet auf einem Kern gemessen ~0.25 s (18 Teams), ~0.45 s
+    (20 Teams, direkter Vergleich) und ~0.9-1.1 s (CL: das Nachspielen der K.o.-Phase allein ~0.35 s);
+    mit executor verteilen sich die Blöcke auf die Worker.
+    Liefert (df wie simulate_season, neuer state) – state für den nächsten Aufruf aufheben.
+    """
+    with metrics.span('strengths'):
+        model = build_season_model(matches, current_table, is_cl, history=history, tiebreak=tiebreak)
+    with metrics.span('monte_carlo'):
+        state, levels, hg, ag = update_season_state(model, state, n_simulations, seed, executor)
+        # Für Szenarien (evaluate_scenario): Modell ohne Ergebnistabelle, die kommt bei Bedarf aus dem Match-Stand
+        state['model'] = {key: value for key, value in model.items() if key != 'score_sampler'}
+        state['matches'], state['history'] = as_match_store(matches), history
+        counts, state['flags'] = _tally_state(model, state, levels, hg, ag, state['stats'], executor)
+        std_error = max_standard_error(counts, n_simulations) if n_simulations else float('inf')
+    metrics.incr('simulations_run', n_simulations)
+    return _counts_frame(model, counts, n_simulations, std_error), state
+
+# --- WAS-WÄRE-WENN (SZENARIEN AUF DER GESPEICHERTEN SIMULATION) ---
+SCENARIO_MIN_SIMULATIONS = 4000 # Darunter wird neu gewürfelt statt gefiltert (Standardfehler sonst > 0.8 %-Pkt.)
+SCENARIO_OUTCOMES = ('1', 'X', '2')
+
+def scenario_cells(result, goal_size):
+    """Erlaubte Endstände als (G x G) Maske: '1'/'X'/'2' oder exakt 'h:a'."""
+    goals = np.arange(goal_size)
+    diff = goals[:, None] - goals[None, :]
+    if result == '1': return diff > 0
+    if result == 'X': return diff == 0
+    if result == '2': return diff < 0
+    home, away = (int(g) for g in str(result).split(':'))
+    cells = np.zeros((goal_size, goal_size), dtype=bool)
+    if home >= goal_size or away >= goal_size: raise ValueError(f"Ergebnis {result} liegt außerhalb der Ergebnistabelle")
+    cells[home, away] = True
+    return cells
+
+def _conditional_sampler(sampler, fixture, cells):
+    """Ergebnistabelle eines Spiels, bedingt auf die erlaubten Endstände (pro Formstufen-Kombination)."""
+    cdf = sampler['cdf'][fixture].reshape(-1, sampler['goal_size'] ** 2).astype(float)
+    pmf = np.diff(cdf, axis=1, prepend=0.0) * cells.ravel()
+    mass = pmf.sum(axis=1, keepdims=True)
+    if (mass <= 0).any(): raise ValueError("Erzwungenes Ergebnis ist für dieses Spiel unmöglich")
+    cond = np.cumsum(pmf / mass, axis=1)
+    cond[:, -1] = 1.0
+    cond = cond.astype(np.float32)
+    return {'cdf': cond.reshape(1, FORM_LEVELS, FORM_LEVELS, -1), 'goal_size': sampler['goal_size'],
+            'guide': _guide_table(cond).reshape(1, FORM_LEVELS, FORM_LEVELS, SCORE_GUIDE_SIZE)}
+
+def evaluate_scenario(state, forced, min_simulations=SCENARIO_MIN_SIMULATIONS, executor=None):
+    """
+    Was-wäre-wenn auf der gespeicherten Simulation (state aus simulate_season_incremental), ohne neuen Lauf.
+    forced: {(Heim, Gast): Ergebnis} mit '1', 'X', '2' oder exakt 'h:a' (nur offene, simulierte Spiele).
+
+    Filter: gezählt werden nur die Simulationen, in denen alle erzwungenen Spiele ohnehin so ausgingen,
+    gewichtet mit 1 / P(Ergebnis | Formstufen) (Millisekunden). Liegt die effektive Anzahl darunter unter
+    min_simulations, werden nur die erzwungenen Spiele in den übrigen Simulationen bedingt neu gewürfelt
+    (mit ihren festen Zufallszahlen) und alles neu gezählt. Beide Wege schätzen dasselbe.
+    Liefert df wie simulate_season (n_simulations = effektive Anzahl); attrs zusätzlich 'scenario_method'
+    ('filter'/'resample') und 'scenario_share' (Anteil der Simulationen, die das Szenario schon erfüllten).
+    """
+    model = state['model']
+    sampler = score_sampler(fixture_score_table(state['matches'], state['history']), model['fixture_pos'])
+    goal_size = sampler['goal_size']
+    columns = {key: i for i, key in enumerate(state['fixture_keys'])}
+    constraints = []
+    for (home, away), result in forced.items():
+        col = columns.get(stable_key(home, away))
+        if col is None: raise ValueError(f"{home} - {away} ist kein offenes, simuliertes Spiel")
+        constraints.append((col, scenario_cells(result, goal_size)))
+
+    n = state['n']
+    home_idx, away_idx = model['home_idx'], model['away_idx']
+    # Formstufen liegen nicht im state: für den Filter reichen die Teams der erzwungenen Spiele
+    forced_teams = np.unique([idx[col] for col, _ in constraints for idx in (home_idx, away_idx)]).astype(np.int64)
+    team_col = {team: i for i, team in enumerate(forced_teams)}
+    levels = _crn_form_levels(model, state['team_keys'], state['seed'], n, forced_teams)
+    consistent = np.ones(n, dtype=bool)
+    weight = np.ones(n)
+    for col, cells in constraints:
+        consistent &= cells[_unpack_goals(state['goals'][:, col])]
+        # Wer verliert, hatte im Schnitt schlechtere Form. 1 / P(Ergebnis | Formstufen) gleicht das aus,
+        # damit der Rest der Saison wie beim Neu-Würfeln (Eingriff statt Beobachtung) unverändert bleibt
+        cdf = sampler['cdf'][col].reshape(FORM_LEVELS, FORM_LEVELS, -1).astype(float)
+        mass = (np.diff(cdf, axis=2, prepend=0.0) * cells.ravel()).sum(axis=2)
+        weight /= np.maximum(mass[levels[:, team_col[home_idx[col]]], levels[:, team_col[away_idx[col]]]], 1e-12)
+    share = consistent.mean() if n else 0.0
+
+    weight = weight[consistent]
+    n_effective = weight.sum() ** 2 / (weight ** 2).sum() if len(weight) else 0.0
+    if n_effective >= min_simulations:
+        with metrics.span('scenario_filter'):
+            weight *= n_effective / weight.sum() # Zählungen auf die effektive Stichprobengröße skalieren
+            counts = {col: weight @ np.unpackbits(flags, axis=0, count=n)[consistent] for col, flags in state['flags'].items()}
+            for col, pinned in model['pinned'].items():
+                counts[col] = counts[col] + n_effective * pinned
+            counts['TotalPoints'] = (weight @ state['stats']['points'][consistent]
+                                     + n_effective * (model['base']['points'] + model['expected_skipped_points']))
+        method, n_used = 'filter', n_effective
+    else:
+        with metrics.span('scenario_resample'):
+            levels = _crn_form_levels(model, state['team_keys'], state['seed'], n)
+            hg, ag = _unpack_goals(state['goals'])
+            stats = {key: values.astype(np.int16) for key, values in state['stats'].items()}
+            for col, cells in constraints:
+                redo = np.flatnonzero(~cells[hg[:, col], ag[:, col]])
+                if not len(redo): continue
+                u = np.concatenate([crn_uniforms(state['seed'], block, state['fixture_keys'][col:col + 1], rows.stop - rows.start)
+                                    for block, rows in _sim_blocks(n)])[redo]
+                redo_levels = levels[redo]
+                new_h, new_a = sample_scores(None, _conditional_sampler(sampler, col, cells),
+                                             redo_levels[:, home_idx[col:col + 1]], redo_levels[:, away_idx[col:col + 1]], u=u)
+                teams = (home_idx[col:col + 1], away_idx[col:col + 1])
+                minus = _state_table_stats(model, *teams, hg[redo, col:col + 1], ag[redo, col:col + 1])
+                hg[redo, col], ag[redo, col] = new_h[:, 0], new_a[:, 0]
+                plus = _state_table_stats(model, *teams, hg[redo, col:col + 1], ag[redo, col:col + 1])
+                for key in stats: stats[key][redo] += plus[key] - minus[key]
+            counts, _ = _tally_state(model, state, levels, hg, ag, stats, executor)
+        method, n_used = 'resample', n
+
+    metrics.incr(f'scenarios_{method}')
+    df = _counts_frame(model, counts, n_used, max_standard_error(counts, n_used) if n_used else float('inf'))
+    df.attrs.update(scenario_method=method, scenario_share=float(share))
+    return df
+
+def poisson_pmf_matrix(lam, max_goals):
+    """PMF-Vektoren P(k Tore), k = 0..max_goals, für alle lambdas auf einmal (Rekursion statt Fakultät)."""
+    lam = np.asarray(lam, dtype=float)
+    k = np.arange(1, max_goals + 1)
+    ratios = lam[:, None] / k[None, :]
+    pmf = np.empty((len(lam), max_goals + 1))
+    pmf[:, 0] = 1.0
+    pmf[:, 1:] = np.cumprod(ratios, axis=1)
+    return pmf * np.exp(-lam)[:, None]
+
+def adaptive_goal_cap(lam, tail_mass=1e-9, min_goals=9):
+    """Kleinste Tor-Obergrenze, ab der die restliche Poisson-Masse für alle lambdas unter tail_mass liegt."""
+    lam_max = float(np.max(lam)) if len(lam) else 0.0
+    cap = max(min_goals, int(np.ceil(lam_max)))
+    pmf = poisson_pmf_matrix([lam_max], cap)[0]
+    while 1.0 - pmf.sum() > tail_mass:
+        cap += 5
+        pmf = poisson_pmf_matrix([lam_max], cap)[0]
+    return cap
+
+def score_probability_tensor(lam_h, lam_a, max_goals=None, rho=0.0):
+    """
+    Ergebnis-Wahrscheinlichkeiten aller Spiele als (Spiele x G x G) Tensor
+    (Zeile = Heimtore, Spalte = Gasttore), äußeres Produkt der PMF-Vektoren.
+    rho != 0 wendet die Dixon-Coles-Korrektur auf 0:0, 0:1, 1:0 und 1:1 an (Summe bleibt 1),
+    auch als Array pro Spiel.
+    """
+    if max_goals is None:
+        max_goals = adaptive_goal_cap(np.concatenate([lam_h, lam_a]))
+    pmf_h = poisson_pmf_matrix(lam_h, max_goals)
+    pmf_a = poisson_pmf_matrix(lam_a, max_goals)
+    probs = pmf_h[:, :, None] * pmf_a[:, None, :]
+    if np.any(rho):
+        lam_h, lam_a = np.asarray(lam_h, dtype=float), np.asarray(lam_a, dtype=float)
+        probs[:, 0, 0] *= np.maximum(1 - lam_h * lam_a * rho, 0)
+        probs[:, 0, 1] *= np.maximum(1 + lam_h * rho, 0)
+        probs[:, 1, 0] *= np.maximum(1 + lam_a * rho, 0)
+        probs[:, 1, 1] *= 1 - rho
+    return probs
+
+def summarize_score_tensor(probs):
+    """1/X/2, wahrscheinlichstes Ergebnis, Über/Unter 2.5 und Beide-treffen aus dem Score-Tensor."""
+    n, size, _ = probs.shape
+    goals = np.arange(size)
+    diff = goals[:, None] - goals[None, :]
+    total = goals[:, None] + goals[None, :]
+    flat_idx = probs.reshape(n, size * size).argmax(axis=1)
+    return {
+        '1': probs[:, diff > 0].sum(axis=1),
+        'X': probs[:, diff == 0].sum(axis=1),
+        '2': probs[:, diff < 0].sum(axis=1),
+        'over': probs[:, total > 2].sum(axis=1),
+        'btts': probs[:, 1:, 1:].sum(axis=(1, 2)),
+        'best_home': flat_idx // size,
+        'best_away': flat_idx % size,
+    }
+
+FORM_SD = 0.10   # Streuung der Tagesform pro Team und Simulation
+FORM_LEVELS = 3  # Diskrete, gleich wahrscheinliche Formstufen (ungerade: mittlere Stufe = neutrale Form)
+SCORE_TABLE_TAIL_MASS = 1e-6 # Abgeschnittene Rest-Masse pro Verteilung (wird auf die Tabelle umgelegt)
+SCORE_GUIDE_SIZE = 64        # Einstiegspunkte pro Verteilung fürs Sampling
+MATCH_MINUTES = 90           # Laufende Spiele: Rest-Torerwartung anteilig zur verbleibenden Spielzeit
+
+def _form_factors(n_levels=FORM_LEVELS, sd=FORM_SD):
+    """Quantil-Mittelpunkte von N(1, sd), so skaliert, dass die Varianz exakt sd² bleibt."""
+    z = np.array([NormalDist().inv_cdf((k + 0.5) / n_levels) for k in range(n_levels)])
+    return 1.0 + sd * z / np.sqrt((z ** 2).mean())
+
+FORM_FACTORS = _form_factors()
+
+_SCORE_TABLE_CACHE = LockedLRU(_STRENGTH_CACHE_SIZE)
+
+def fixture_score_table(matches, history=None):
+    """
+    Ergebnisverteilungen aller offenen Spiele, einmal pro Match-Stand berechnet und von
+    Monte-Carlo, CL-Bracket und Kicktipp gemeinsam genutzt.
+    cdf: (Spiele x Formstufe Heim x Formstufe Gast x G²) kumulierte Verteilung über alle Ergebnisse
+    (flach, Index = Heimtore * G + Gasttore); summary: 1/X/2, Tipp, Über 2.5, Beide treffen bei neutraler Form.
+    position bildet Store-Zeilen auf Tabellenzeilen ab (-1 = kein offenes Spiel).
+    Laufende Spiele sind bedingt auf Stand und Minute: nur die Resttore der verbleibenden Spielzeit
+    werden gewürfelt (ohne Dixon-Coles-Korrektur) und auf den aktuellen Stand addiert.
+    """
+    store = as_match_store(matches)
+    key = store.snapshot_key() + (f"|{history.snapshot_key()}" if history is not None and not history.empty else "")
+    cached = _SCORE_TABLE_CACHE.get(key)
+    if cached is not None: return cached
+
+    fit = fit_team_model(store, history)
+    rows = np.flatnonzero(~store.finished & store.valid)
+    attack = np.append(fit['attack'], 1.0) # Unbekannte Teams (noch kein Spiel): neutrale Stärke
+    defense = np.append(fit['defense'], 1.0)
+    remap = store.team_ids_for(fit['teams'])
+    remap[remap < 0] = len(fit['teams'])
+    h, a = remap[store.home[rows]], remap[store.away[rows]]
+
+    # Alle Formstufen-Kombinationen: Heim-Form wirkt auf Heim-Angriff und Heim-Abwehr, analog Gast
+    f_h = FORM_FACTORS[None, :, None]
+    f_a = FORM_FACTORS[None, None, :]
+    base = fit['avg_goals']
+    live = store.live[rows]
+    remaining = np.where(live, np.clip(MATCH_MINUTES - store.minute[rows], 0, MATCH_MINUTES) / MATCH_MINUTES, 1.0)
+    lam_h = attack[h][:, None, None] * f_h * defense[a][:, None, None] * (2 - f_a) * base * fit['home_advantage']
+    lam_a = attack[a][:, None, None] * f_a * defense[h][:, None, None] * (2 - f_h) * base
+    lam_h = (lam_h * remaining[:, None, None]).ravel()
+    lam_a = (lam_a * remaining[:, None, None]).ravel()
+    now_h = np.where(live, store.home_goals[rows], 0)
+    now_a = np.where(live, store.away_goals[rows], 0)
+
+    goal_size = adaptive_goal_cap(np.concatenate([lam_h, lam_a]), SCORE_TABLE_TAIL_MASS) + 1 if len(rows) else 1
+    goal_size += int(max(now_h.max(), now_a.max())) if live.any() else 0 # Platz für den aktuellen Stand
+    rho = np.repeat(np.where(live, 0.0, fit['rho']), FORM_LEVELS ** 2)
+    probs = score_probability_tensor(lam_h, lam_a, goal_size - 1, rho=rho)
+    grid = probs.reshape(len(rows), FORM_LEVELS ** 2, goal_size, goal_size)
+    for i in np.flatnonzero(now_h + now_a): # Resttore auf den aktuellen Stand verschieben
+        g_h, g_a = now_h[i], now_a[i]
+        grid[i, :, g_h:, g_a:] = grid[i, :, :goal_size - g_h, :goal_size - g_a].copy()
+        grid[i, :, :g_h] = 0
+        grid[i, :, :, :g_a] = 0
+    flat = probs.reshape(len(lam_h), goal_size ** 2)
+    cdf = np.cumsum(flat, axis=1)
+    cdf /= cdf[:, -1:]           # Abgeschnittene Rest-Masse auf die Tabelle verteilen
+    cdf[:, -1] = 1.0
+    cdf = cdf.astype(np.float32) # Halber Speicher, die Tabelle wird an jeden Worker gepickelt
+    shape = (len(rows), FORM_LEVELS, FORM_LEVELS)
+
+    middle = FORM_LEVELS // 2
+    neutral = probs.reshape(len(rows), FORM_LEVELS, FORM_LEVELS, goal_size, goal_size)[:, middle, middle]
+    position = np.full(len(store), -1, dtype=np.int64)
+    position[rows] = np.arange(len(rows))
+    table = {
+        'rows': rows, 'position': position, 'goal_size': goal_size,
+        'cdf': cdf.reshape(*shape, goal_size ** 2), 'guide': _guide_table(cdf).reshape(*shape, SCORE_GUIDE_SIZE),
+        'summary': summarize_score_tensor(neutral),
+    }
+    metrics.incr('score_tables_built')
+    _SCORE_TABLE_CACHE.put(key, table)
+    return table
+
+def _guide_table(cdf):
+    """
+    Einstiegspunkte fürs Inverse-CDF-Sampling (Guide-Table nach Chen):
+    guide[r, j] = Anzahl Zellen mit cdf <= j / SCORE_GUIDE_SIZE, ab dort ist die Suche nur noch ein paar Schritte lang.
+    """
+    n_rows = len(cdf)
+    bucket = np.ceil(cdf.astype(float) * SCORE_GUIDE_SIZE).astype(np.int64) # Kleinstes j mit cdf <= j / SCORE_GUIDE_SIZE
+    flat = (np.arange(n_rows)[:, None] * (SCORE_GUIDE_SIZE + 1) + bucket).ravel()
+    counts = np.bincount(flat, minlength=n_rows * (SCORE_GUIDE_SIZE + 1)).reshape(n_rows, SCORE_GUIDE_SIZE + 1)
+    return np.cumsum(counts, axis=1)[:, :SCORE_GUIDE_SIZE].astype(np.int16)
+
+def score_sampler(table, fixture_pos):
+    """Ausschnitt der Ergebnistabelle für die gewählten Spiele (klein genug zum Pickeln an Worker-Prozesse)."""
+    return {'cdf': table['cdf'][fixture_pos], 'guide': table['guide'][fixture_pos], 'goal_size': table['goal_size']}
+
+def sample_scores(rng, sampler, level_h, level_a, u=None):
+    """
+    Inverse-CDF-Sampling: eine Gleichverteilte pro Spiel und Simulation -> (Heimtore, Gasttore).
+    level_h/level_a: (Simulationen x Spiele) Formstufen der beiden Teams.
+    u: fest vorgegebene Gleichverteilte in derselben Form (sonst aus rng).
+    """
+    n_sims, n_fixtures = level_h.shape
+    goal_size = sampler['goal_size']
+    cells = goal_size ** 2
+    if not n_fixtures:
+        empty = np.zeros((n_sims, 0), dtype=np.int64)
+        return empty, empty
+    cdf = sampler['cdf'].reshape(-1)
+    row = ((np.arange(n_fixtures)[None, :] * FORM_LEVELS + level_h) * FORM_LEVELS + level_a).ravel()
+    u = rng.random(row.shape) if u is None else np.asarray(u, dtype=float).ravel()
+    pos = row * cells + sampler['guide'].reshape(-1)[row * SCORE_GUIDE_SIZE + (u * SCORE_GUIDE_SIZE).astype(np.int64)]
+    todo = np.flatnonzero(cdf[pos] <= u)
+    while len(todo): # Vorwärts bis zur ersten Zelle mit cdf > u (letzte Zelle hat cdf = 1)
+        pos[todo] += 1
+        todo = todo[cdf[pos[todo]] <= u[todo]]
+    idx = (pos - row * cells).reshape(n_sims, n_fixtures)
+    return idx // goal_size, idx % goal_size
+
+def predict_upcoming_matches(matches, next_n=9, history=None):
+    """
+    Kicktipp-Prognose für die nächsten next_n Spiele (None = komplette Rest-Saison).
+    Liest die gemeinsame Ergebnistabelle (fixture_score_table) der Monte-Carlo, laufende Spiele
+    also bedingt auf Stand und Minute ('Live': z.B. "63' 2:0", sonst leer).
+    """
+    store = as_match_store(matches)
+    table = fixture_score_table(store, history)
+    future = table['rows'][np.argsort(store.dates[table['rows']], kind='stable')]
+    if next_n is not None: future = future[:next_n]
+    if not len(future): return pd.DataFrame()
+
+    pos = table['position'][future]
+    summary = {k: v[pos] for k, v in table['summary'].items()}
+    return pd.DataFrame({
+        'Datum': pd.to_datetime(store.dates[future]).tz_localize('UTC'),
+        'Heim': store.teams[store.home[future]], 'Auswärts': store.teams[store.away[future]],
+        'Live': [f"{m}' {h}:{a}" if m >= 0 else "" for m, h, a in
+                 zip(store.minute[future], store.home_goals[future], store.away_goals[future])],
+        'Tipp': [f"{h}:{a}" for h, a in zip(summary['best_home'], summary['best_away'])],
+        '1': summary['1']*100, 'X': summary['X']*100, '2': summary['2']*100,
+        'Über 2.5': summary['over']*100, 'Beide treffen': summary['btts']*100,
+    })
@@ -0,0 +1,65 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data
+
+class StubAPI(ThreadingHTTPServer):
+    """Lokaler HTTP-Server: beantwortet GETs der Reihe nach aus responses (die letzte Antwort wiederholt sich)."""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.responses = [(200, {}, "{}")]
+        self.requests = [] # Request-Header pro Aufruf
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/competitions"
+
+    @property
+    def url(self):
+        return f"{self.base_url}/PL/matches"
+
+    def respond(self, *responses):
+        with self.lock:
+            self.responses = list(responses)
+
+    def next_response(self, headers):
+        with self.lock:
+            self.requests.append(headers)
+            return self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status, headers, body = self.server.next_response(dict(self.headers))
+        payload = body.encode() if body else b""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """Stub-Server plus frischer Payload-Cache, Breaker und Rate-Limiter für jeden Test."""
+    monkeypatch.setattr(data, "_PAYLOAD_CACHE", data.PayloadCache(str(tmp_path / "payloads.sqlite")))
+    monkeypatch.setattr(data, "CIRCUIT_BREAKER", data.CircuitBreaker(failures=2, cooldown=0.2))
+    monkeypatch.setattr(data, "RATE_LIMITER", data.TokenBucket(6000))
+    monkeypatch.setattr(data, "BACKOFF_BASE_SECONDS", 0.01)
+    server = StubAPI()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,195 @@
+import json
+import time
+
+import data
+import metrics
+
+HEADERS = {'X-Auth-Token': 'test'}
+
+def counter(name):
+    return metrics.counters().get(name, 0)
+
+def expire(monkeypatch, fresh=0, stale=0):
+    monkeypatch.setattr(data, "PAYLOAD_FRESH_SECONDS", fresh)
+    monkeypatch.setattr(data, "PAYLOAD_STALE_SECONDS", stale)
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timeout"
+        time.sleep(0.01)
+
+def test_200_stores_body_and_etag(api):
+    api.respond((200, {'ETag': '"v1"', 'Last-Modified': 'Sat, 01 Aug 2026 10:00:00 GMT'}, '{"round": 1}'))
+    assert data.make_api_request(api.url, HEADERS, cache_key='k') == {'round': 1}
+
+    cached = data.get_payload_cache().get('k')
+    assert json.loads(cached['body']) == {'round': 1}
+    assert cached['etag'] == '"v1"'
+    assert cached['last_modified'] == 'Sat, 01 Aug 2026 10:00:00 GMT'
+
+def test_fresh_entry_is_served_without_request(api):
+    data.get_payload_cache().put('k', '{"round": 1}', '"v1"')
+    assert data.make_api_request(api.url, HEADERS, cache_key='k') == {'round': 1}
+    assert api.requests == []
+
+def test_304_reuses_cached_body(api, monkeypatch):
+    expire(monkeypatch)
+    cache = data.get_payload_cache()
+    cache.put('k', '{"round": 1}', '"v1"')
+    before = cache.get('k')['fetched_at']
+    api.respond((304, {}, ""))
+
+    assert data.make_api_request(api.url, HEADERS, cache_key='k') == {'round': 1}
+    assert api.requests[0]['If-None-Match'] == '"v1"'
+    assert cache.get('k')['fetched_at'] >= before # touch(): gilt wieder als frisch
+
+def test_stale_window_serves_cache_and_revalidates_in_background(api, monkeypatch):
+    expire(monkeypatch, fresh=0, stale=3600)
+    cache = data.get_payload_cache()
+    cache.put('k', '{"round": 1}', '"v1"')
+    api.respond((200, {'ETag': '"v2"'}, '{"round": 2}'))
+
+    assert data.make_api_request(api.url, HEADERS, cache_key='k') == {'round': 1}
+    wait_for(lambda: cache.get('k')['etag'] == '"v2"')
+    assert json.loads(cache.get('k')['body']) == {'round': 2}
+    assert len(api.requests) == 1
+
+def test_revalidate_is_synchronous_inside_stale_window(api, monkeypatch):
+    expire(monkeypatch, fresh=0, stale=3600)
+    data.get_payload_cache().put('k', '{"round": 1}', '"v1"')
+    api.respond((200, {'ETag': '"v2"'}, '{"round": 2}'))
+
+    assert data.make_api_request(api.url, HEADERS, cache_key='k', revalidate=True) == {'round': 2}
+
+def test_fresh_seconds_skips_revalidation(api, monkeypatch):
+    expire(monkeypatch, fresh=0, stale=3600)
+    data.get_payload_cache().put('k', '{"round": 1}', '"v1"')
+    api.respond((200, {'ETag': '"v2"'}, '{"round": 2}'))
+
+    # Live-Polling: Torschützen bleiben innerhalb ihres eigenen Fensters ohne Request
+    assert data.make_api_request(api.url, HEADERS, cache_key='k', revalidate=True, fresh_seconds=300) == {'round': 1}
+    assert api.requests == []
+    assert data.make_api_request(api.url, HEADERS, cache_key='k', revalidate=True) == {'round': 2}
+
+def test_stale_if_error(api, monkeypatch):
+    expire(monkeypatch)
+    data.get_payload_cache().put('k', '{"round": 1}', '"v1"')
+    api.respond((503, {}, ""))
+    fallbacks = counter('payload_stale_if_error')
+
+    assert data.make_api_request(api.url, HEADERS, cache_key='k') == {'round': 1}
+    assert len(api.requests) == 1 # Mit alten Daten kein Retry
+    assert counter('payload_stale_if_error') == fallbacks + 1
+
+MAINTENANCE_PAGE = (200, {'Content-Type': 'text/html'}, "<html><body>Wartungsarbeiten</body></html>")
+
+def test_unparsable_200_is_not_cached(api):
+    api.respond(MAINTENANCE_PAGE)
+    assert data.make_api_request(api.url, HEADERS, cache_key='k') is None
+    assert data.make_api_request(api.url, HEADERS, cache_key='k') is None
+    assert data.get_payload_cache().get('k') is None
+    assert len(api.requests) == 2 # Nichts gespeichert: jeder Aufruf fragt neu an
+    assert data.make_api_request(api.url, HEADERS) is None # Ohne Cache ebenso kein Fehler
+
+def test_unparsable_200_falls_back_to_stale_data(api, monkeypatch):
+    expire(monkeypatch)
+    cache = data.get_payload_cache()
+    cache.put('k', '{"round": 1}', '"v1"')
+    api.respond(MAINTENANCE_PAGE)
+
+    assert data.make_api_request(api.url, HEADERS, cache_key='k') == {'round': 1}
+    assert json.loads(cache.get('k')['body']) == {'round': 1}
+
+def test_corrupt_immutable_entry_is_dropped_and_refetched(api, monkeypatch):
+    monkeypatch.setattr(data, "FD_BASE_URL", api.base_url)
+    monkeypatch.setattr(data, "_HISTORY_STORES", {})
+    cache = data.get_payload_cache()
+    cache_key = data.payload_key(2021, 'matches', 2023)
+    cache.put(cache_key, MAINTENANCE_PAGE[2])
+
+    assert data.fetch_past_season('key', 2021, 2023, cached_only=True) is None
+    assert api.requests == [] # Auch ein kaputter Eintrag löst im ersten Refresh keinen Request aus
+    assert cache.get(cache_key) is None
+
+    api.respond((200, {}, '{"matches": []}'))
+    assert data.fetch_past_season('key', 2021, 2023) is not None # Backfill lädt die Saison neu
+    assert json.loads(cache.get(cache_key)['body']) == {'matches': []}
+
+def test_error_without_cache_returns_none(api):
+    api.respond((404, {}, '{"message": "restricted"}'))
+    assert data.make_api_request(api.url, HEADERS, cache_key='k') is None
+    assert data.get_payload_cache().get('k') is None
+
+def test_refused_season_is_remembered_across_restarts(api, tmp_path, monkeypatch):
+    api.respond((403, {}, '{"message": "restricted"}'))
+    assert data.make_api_request(api.url, HEADERS, cache_key='2019', immutable=True) is None
+    assert len(api.requests) == 1
+
+    monkeypatch.setattr(data, "_PAYLOAD_CACHE", data.PayloadCache(str(tmp_path / "payloads.sqlite"))) # Neustart
+    assert data.make_api_request(api.url, HEADERS, cache_key='2019', immutable=True) is None
+    assert len(api.requests) == 1
+
+def test_history_backfill_runs_in_background(api, monkeypatch):
+    monkeypatch.setattr(data, "FD_BASE_URL", api.base_url)
+    monkeypatch.setattr(data, "_HISTORY_STORES", {})
+    api.respond((200, {}, '{"matches": []}'))
+
+    assert data.fetch_history_store('key', 2021, 2024, cached_only=True).empty
+    assert api.requests == [] # Erster Refresh: kein Request für Vorsaisons
+    done = []
+    data.backfill_history_in_background('key', 2021, 2024, on_done=lambda: done.append(True))
+    wait_for(lambda: done)
+    assert len(api.requests) == data.HISTORY_SEASONS
+    data.fetch_history_store('key', 2021, 2024, cached_only=True)
+    assert len(api.requests) == data.HISTORY_SEASONS
+
+def test_429_waits_for_retry_after(api):
+    api.respond((429, {'Retry-After': '0.3'}, ""), (200, {}, '{"round": 1}'))
+
+    start = time.monotonic()
+    status, body, _ = data._fetch_from_api(api.url, HEADERS, retries=2)
+    assert status == 200 and json.loads(body) == {'round': 1}
+    assert len(api.requests) == 2
+    assert time.monotonic() - start >= 0.3
+    assert data.CIRCUIT_BREAKER.state == 'closed' # 429 ist kein API-Ausfall
+
+def test_retry_after_http_date():
+    assert data.retry_after_seconds('120') == 120.0
+    assert data.retry_after_seconds(None) is None
+    assert data.retry_after_seconds('Mon, 01 Jan 2001 00:00:00 GMT') == 0.0 # Vergangenes Datum
+
+def test_circuit_breaker_opens_and_half_opens(api):
+    breaker = data.CIRCUIT_BREAKER
+    api.respond((503, {}, ""))
+    for _ in range(breaker.failures):
+        assert data._fetch_from_api(api.url, HEADERS, retries=1) == (None, None, None)
+    assert breaker.state == 'open'
+
+    sent = len(api.requests)
+    assert data._fetch_from_api(api.url, HEADERS, retries=1) == (None, None, None)
+    assert len(api.requests) == sent # Offen: kein Request
+
+    time.sleep(breaker.cooldown + 0.05)
+    assert breaker.state == 'half_open'
+    assert data._fetch_from_api(api.url, HEADERS, retries=1) == (None, None, None)
+    assert breaker.state == 'open' # Gescheiterter Probe-Request: Cooldown von vorn
+
+    time.sleep(breaker.cooldown + 0.05)
+    api.respond((200, {}, '{"round": 1}'))
+    status, _, _ = data._fetch_from_api(api.url, HEADERS, retries=1)
+    assert status == 200
+    assert breaker.state == 'closed'
+
+def test_half_open_probe_released_on_unexpected_error(api, monkeypatch):
+    breaker = data.CIRCUIT_BREAKER
+    breaker.opened = time.monotonic() - breaker.cooldown
+    class BrokenSession:
+        def get(self, *args, **kwargs): raise ValueError("kaputt")
+    monkeypatch.setattr(data, "_SESSION", BrokenSession())
+
+    try:
+        data._fetch_from_api(api.url, HEADERS, retries=1)
+    except ValueError:
+        pass
+    assert breaker.allow() # Nächster Probe-Request darf wieder durch
@@ -0,0 +1,8 @@
+import scheduler
+
+def test_has_result_after_first_run():
+    sched = scheduler.LeagueScheduler(lambda name: {'league': name}, ["A", "B"], max_workers=1)
+    assert not sched.has_result("A")
+    sched.start()
+    assert sched.get("A", timeout=5) == {'league': "A"}
+    assert sched.has_result("A")
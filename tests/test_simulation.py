@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+import benchmark
+import data
+import resultcache
+import simulation
+from matchstore import MatchStore
+
+# (Teams, CL-Ligaphase, Tiebreak) wie die sechs Ligen der App
+LEAGUES = {
+    "Bundesliga": (18, False, 'goal_difference'),
+    "Premier League": (20, False, 'goal_difference'),
+    "La Liga": (20, False, 'head_to_head'),
+    "Serie A": (20, False, 'head_to_head'),
+    "Ligue 1": (18, False, 'goal_difference'),
+    "Champions League": (36, True, 'uefa'),
+}
+
+def test_states_and_results_of_all_leagues_fit_default_budget():
+    # Saisonstart = meiste offene Spiele = größte Zustände
+    cache = resultcache.ResultCache()
+    for league, (n_teams, is_cl, tiebreak) in LEAGUES.items():
+        matches = MatchStore.from_frame(benchmark.synthetic_league(n_teams, completion=0.0, cl_league_phase=is_cl))
+        table = data.calculate_current_table(matches, tiebreak)
+        prognose, state = simulation.simulate_season_incremental(matches, table, is_cl=is_cl, seed=1, tiebreak=tiebreak)
+        cache.put(resultcache.state_key(league), state)
+        cache.put(resultcache.result_key(league, matches.snapshot_key()), {'prognose': prognose, 'table': table, 'matches': matches})
+
+    stats = cache.stats()
+    assert stats['evictions'] == 0
+    assert stats['entries'] == 2 * len(LEAGUES)
+    assert stats['bytes'] <= resultcache.RESULT_CACHE_MAX_BYTES
+
+PROBABILITIES = ['Meister', 'CL', 'Abstieg']
+
+def test_pruning_agrees_with_full_simulation():
+    # Kurz vor Saisonende: mehr als die Hälfte der Teams ist für alle Schwellen entschieden
+    matches = MatchStore.from_frame(benchmark.synthetic_league(20, completion=0.95))
+    table = data.calculate_current_table(matches)
+    pruned = simulation.build_season_model(matches, table, prune=True)
+    full = simulation.build_season_model(matches, table, prune=False)
+    assert len(pruned['active']) < 20 and len(pruned['home_idx']) < len(full['home_idx'])
+
+    n = 20000
+    frames = [simulation._counts_frame(model, simulation.run_season_shards(model, n, seed=3), n, 0) for model in (pruned, full)]
+    pruned_df, full_df = frames[0], frames[1].loc[frames[0].index]
+    decided = [pruned['teams'][i] for i in np.setdiff1d(np.arange(20), pruned['active'])]
+    # Entschiedene Teams: exakt 0/100 % in beiden Läufen, die übrigen im Rahmen des Stichprobenfehlers
+    np.testing.assert_array_equal(pruned_df.loc[decided, PROBABILITIES], full_df.loc[decided, PROBABILITIES])
+    assert np.isin(pruned_df.loc[decided, PROBABILITIES], [0.0, 100.0]).all()
+    assert (pruned_df[PROBABILITIES] - full_df[PROBABILITIES]).abs().max().max() < 2.0
+    assert (pruned_df['AvgPoints'] - full_df['AvgPoints']).abs().max() < 0.2
+
+def forced_model(model, col, result):
+    """Modell, in dem Spiel col nur noch Endstände nach result annehmen kann (bedingte Ergebnistabelle)."""
+    sampler = dict(model['score_sampler'], cdf=model['score_sampler']['cdf'].copy(), guide=model['score_sampler']['guide'].copy())
+    cond = simulation._conditional_sampler(sampler, col, simulation.scenario_cells(result, sampler['goal_size']))
+    sampler['cdf'][col], sampler['guide'][col] = cond['cdf'][0], cond['guide'][0]
+    return dict(model, score_sampler=sampler)
+
+def test_scenario_matches_full_resimulation():
+    matches = MatchStore.from_frame(benchmark.synthetic_league(18, completion=0.5))
+    table = data.calculate_current_table(matches)
+    _, state = simulation.simulate_season_incremental(matches, table, seed=1)
+    model = simulation.build_season_model(matches, table)
+    fixture = (model['teams'][model['home_idx'][0]], model['teams'][model['away_idx'][0]])
+
+    n = 40000
+    for result in ('1', '0:2'):
+        # Referenz: komplett neue Monte-Carlo (eigener Seed), das Spiel endet darin immer wie erzwungen
+        counts = simulation.run_season_shards(forced_model(model, 0, result), n, seed=7)
+        reference = simulation._counts_frame(model, counts, n, simulation.max_standard_error(counts, n))
+        for min_simulations in (simulation.SCENARIO_MIN_SIMULATIONS, n + 1):
+            scenario = simulation.evaluate_scenario(state, {fixture: result}, min_simulations=min_simulations)
+            assert scenario.attrs['scenario_method'] == ('filter' if min_simulations <= n else 'resample')
+            tolerance = 4 * np.hypot(scenario.attrs['std_error'], reference.attrs['std_error'])
+            diff = (scenario[PROBABILITIES] - reference.loc[scenario.index, PROBABILITIES]).abs()
+            assert diff.max().max() < tolerance, (result, scenario.attrs['scenario_method'])
+            assert (scenario['AvgPoints'] - reference.loc[scenario.index, 'AvgPoints']).abs().max() < 0.3
+
+def test_incremental_simulation_is_deterministic():
+    frame = benchmark.synthetic_league(20, completion=0.5, seed=2)
+    matches = MatchStore.from_frame(frame)
+    run = lambda store, state: simulation.simulate_season_incremental(store, data.calculate_current_table(store, 'head_to_head'),
+                                                                      state, seed=5, tiebreak='head_to_head')
+    cold, state = run(matches, None)
+    goals = state['goals'].copy()
+
+    # Ohne neue Ergebnisse: warm = kalt, beliebig oft
+    warm, _ = run(matches, state)
+    pd.testing.assert_frame_equal(warm, cold)
+
+    # Mit laufendem Spieltag: zwei Updates auf demselben state liefern dasselbe, der state bleibt unverändert
+    live = MatchStore.from_frame(benchmark.live_snapshot(frame))
+    first, _ = run(live, state)
+    second, _ = run(live, state)
+    pd.testing.assert_frame_equal(first, second)
+    np.testing.assert_array_equal(state['goals'], goals)
+
+def test_season_without_open_fixtures():
+    # Saisonende: keine offenen Spiele mehr, die Tabelle ist das Ergebnis
+    matches = MatchStore.from_frame(benchmark.synthetic_league(18, completion=1.0))
+    table = data.calculate_current_table(matches)
+    df, _ = simulation.simulate_season_incremental(matches, table, seed=1)
+    assert df.loc[table.index[0], 'Meister'] == 100.0
+    assert df['Meister'].sum() == 100.0
+    np.testing.assert_array_equal(df.loc[table.index, 'AvgPoints'], table['Punkte'])
+
+def test_cl_knockout_follows_real_playoff_results():
+    # Ligaphase beendet, Playoffs: 17-24 empfängt zuerst 9-16. Sieben Paarungen entschieden (Gast gewinnt 2:0 und 1:0),
+    # in der achten steht nur das Hinspiel (0:2)
+    frame = benchmark.synthetic_league(36, completion=1.0, cl_league_phase=True)
+    ranked = list(data.calculate_current_table(MatchStore.from_frame(frame), 'uefa').index)
+    first_leg = frame['Date'].max() + pd.Timedelta(days=14)
+    playoffs = []
+    for i in range(8):
+        seeded, unseeded = ranked[8 + i], ranked[16 + i]
+        playoffs.append({'Date': first_leg, 'HomeTeam': unseeded, 'AwayTeam': seeded, 'HomeGoals': 0, 'AwayGoals': 2,
+                         'Finished': True, 'Stage': "PLAYOFFS"})
+        if i < 7:
+            playoffs.append({'Date': first_leg + pd.Timedelta(days=7), 'HomeTeam': seeded, 'AwayTeam': unseeded,
+                             'HomeGoals': 1, 'AwayGoals': 0, 'Finished': True, 'Stage': "PLAYOFFS"})
+    matches = MatchStore.from_frame(pd.concat([frame, pd.DataFrame(playoffs)], ignore_index=True))
+    table = data.calculate_current_table(simulation.league_phase(matches), 'uefa')
+    assert list(table.index) == ranked # K.O.-Spiele zählen nicht zur Tabelle
+
+    df, _ = simulation.simulate_season_incremental(matches, table, n_simulations=4000, is_cl=True, seed=1, tiebreak='uefa')
+    assert (df.loc[ranked[:8], 'Achtelfinale'] == 100).all()
+    assert (df.loc[ranked[8:15], 'Achtelfinale'] == 100).all()
+    assert (df.loc[ranked[16:23], ['Achtelfinale', 'Titel']] == 0).all().all()
+    assert (df.loc[ranked[24:], 'Out'] == 100).all() and (df.loc[ranked[24:], 'Achtelfinale'] == 0).all()
+    open_tie = df.loc[[ranked[15], ranked[23]], 'Achtelfinale']
+    assert open_tie.sum() == 100 and open_tie.iloc[0] > open_tie.iloc[1] > 0
+    sums = df[['Achtelfinale', 'Viertelfinale', 'Halbfinale', 'Finale', 'Titel']].sum()
+    np.testing.assert_allclose(sums, [1600, 800, 400, 200, 100])
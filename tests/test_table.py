@@ -0,0 +1,28 @@
+import pandas as pd
+
+import data
+
+def frame(*results):
+    """Beendete Spiele als DataFrame im Format von fetch_matches_external, ein Spieltag pro Woche."""
+    rows = []
+    for day, (home, away, hg, ag) in enumerate(results):
+        rows.append({'Date': pd.Timestamp("2026-08-21", tz="UTC") + pd.Timedelta(days=7 * day), 'HomeTeam': home, 'AwayTeam': away,
+                     'HomeGoals': hg, 'AwayGoals': ag, 'Finished': True, 'Stage': "REGULAR_SEASON"})
+    return pd.DataFrame(rows)
+
+# A, B, C punktgleich (3), B mit der besten Tordifferenz. Direkter Vergleich: A schlug B, C schlug A, B-C offen
+OLD = [("A", "B", 1, 0)]
+NEW = [("B", "D", 5, 0), ("A", "C", 0, 1)]
+
+def test_apply_results_matches_full_recalculation_with_head_to_head():
+    table = data.calculate_current_table(frame(*OLD), 'head_to_head')
+    updated = data.apply_results(table, frame(*NEW), 'head_to_head', all_matches=frame(*OLD, *NEW))
+    full = data.calculate_current_table(frame(*OLD, *NEW), 'head_to_head')
+
+    assert list(full.index) == ["C", "A", "B", "D"]
+    pd.testing.assert_frame_equal(updated[full.columns], full, check_dtype=False)
+
+def test_apply_results_without_all_matches_falls_back_to_goal_difference():
+    table = data.calculate_current_table(frame(*OLD), 'head_to_head')
+    updated = data.apply_results(table, frame(*NEW), 'head_to_head')
+    assert list(updated.index) == list(data.calculate_current_table(frame(*OLD, *NEW)).index) == ["B", "C", "A", "D"]
@@ -0,0 +1,45 @@
+import numpy as np
+
+import tiebreakers
+
+def test_result_stats_matches_hand_computed_table():
+    # Drei Teams, jeder gegen jeden, zwei Simulationen mit verschiedenen Ergebnissen
+    home, away = np.array([0, 1, 2]), np.array([1, 2, 0])
+    hg = np.array([[2, 0, 3], [0, 2, 0]])
+    ag = np.array([[1, 0, 1], [1, 2, 0]])
+    stats = tiebreakers.result_stats(3, home, away, hg, ag, extended=True)
+
+    expected = {
+        'points':     [[3, 1, 4], [1, 4, 2]],
+        'goals':      [[3, 1, 3], [0, 3, 2]],
+        'against':    [[4, 2, 1], [1, 2, 2]],
+        'diff':       [[-1, -1, 2], [-1, 1, 0]],
+        'wins':       [[1, 0, 1], [0, 1, 0]],
+        'away_goals': [[1, 1, 0], [0, 1, 2]],
+        'away_wins':  [[0, 0, 0], [0, 1, 0]],
+    }
+    for key, values in expected.items():
+        np.testing.assert_array_equal(stats[key], values, err_msg=key)
+
+# A, B, C punktgleich (3), B mit der besten Tordifferenz. Direkter Vergleich: A schlug B, C schlug A, B-C offen
+HOME, AWAY = np.array([0, 1, 0]), np.array([1, 3, 2])
+HG, AG = np.array([[1, 5, 0]]), np.array([[0, 0, 1]])
+
+def test_head_to_head_resolves_tie_through_mini_table():
+    stats = tiebreakers.result_stats(4, HOME, AWAY, HG, AG)
+    h2h_points, h2h_diff = tiebreakers.head_to_head(stats['points'], HOME, AWAY, HG, AG)
+    np.testing.assert_array_equal(h2h_points, [[3, 0, 3, 0]])
+    np.testing.assert_array_equal(h2h_diff, [[0, -1, 1, 0]])
+
+    np.testing.assert_array_equal(tiebreakers.rank_table('goal_difference', stats), [[1, 2, 0, 3]])
+    np.testing.assert_array_equal(tiebreakers.rank_table('head_to_head', stats, (HOME, AWAY, HG, AG)), [[2, 0, 1, 3]])
+
+def test_head_to_head_counts_played_and_simulated_parts():
+    # A-B gespielt (gleich für alle Simulationen), Rest simuliert: in Simulation 2 gewinnt B gegen D nur 1:0
+    played = (HOME[:1], AWAY[:1], HG[:, :1], AG[:, :1])
+    simulated = (HOME[1:], AWAY[1:], np.array([[5, 0], [1, 0]]), np.array([[0, 1], [0, 1]]))
+    stats = tiebreakers.result_stats(4, HOME, AWAY, np.array([[1, 5, 0], [1, 1, 0]]), np.array([[0, 0, 1], [0, 0, 1]]))
+
+    ranking = tiebreakers.rank_table('head_to_head', stats, [played, simulated])
+    np.testing.assert_array_equal(ranking, [[2, 0, 1, 3], [2, 0, 1, 3]])
+    np.testing.assert_array_equal(tiebreakers.rank_table('goal_difference', stats), [[1, 2, 0, 3], [2, 0, 1, 3]])
@@ -0,0 +1,82 @@
+import numpy as np
+
+# Kriterien nach den Punkten, in dieser Reihenfolge (jeweils absteigend)
+TIEBREAK_RULES = {
+    'goal_difference': ('diff', 'goals'),                          # Bundesliga, Premier League, Ligue 1
+    'head_to_head': ('h2h_points', 'h2h_diff', 'diff', 'goals'),   # La Liga, Serie A: direkter Vergleich zuerst
+    'uefa': ('diff', 'goals', 'away_goals', 'wins', 'away_wins'),  # UEFA Ligaphase
+}
+DEFAULT_TIEBREAK = 'goal_difference'
+
+def scatter_add(n_rows, n_cols, cols, values):
+    """Summiert values (n_rows x k) spaltenweise in eine (n_rows x n_cols) Matrix (per bincount)."""
+    values = np.broadcast_to(values, (n_rows, len(cols)))
+    flat = (np.arange(n_rows)[:, None] * n_cols + cols[None, :]).ravel()
+    return np.bincount(flat, weights=values.ravel(), minlength=n_rows * n_cols).reshape(n_rows, n_cols)
+
+def result_stats(n_teams, home, away, hg, ag, extended=False):
+    """
+    Tabellen-Kennzahlen aus Spielergebnissen. home/away: Team-Indizes pro Spiel,
+    hg/ag: (Simulationen x Spiele) Tore. Liefert ein Dict von (Simulationen x Teams) Arrays
+    (points, goals, against, diff; mit extended zusätzlich wins, away_goals, away_wins für UEFA).
+    """
+    n_sims = hg.shape[0]
+    rows = np.arange(n_sims)[:, None] * n_teams
+    flat_home, flat_away = (rows + home[None, :]).ravel(), (rows + away[None, :]).ravel()
+    size = n_sims * n_teams
+    def side(flat, values):
+        values = np.broadcast_to(values, (n_sims, len(home)))
+        return np.bincount(flat, weights=values.ravel(), minlength=size).reshape(n_sims, n_teams)
+    per_team = lambda values_home, values_away: side(flat_home, values_home) + side(flat_away, values_away)
+
+    home_win, away_win, draw = hg > ag, ag > hg, hg == ag
+    stats = {
+        'points': per_team(3 * home_win + draw, 3 * away_win + draw),
+        'goals': per_team(hg, ag),
+        'against': per_team(ag, hg),
+    }
+    stats['diff'] = stats['goals'] - stats['against']
+    if extended:
+        stats['wins'] = per_team(home_win, away_win)
+        stats['away_goals'] = side(flat_away, ag)
+        stats['away_wins'] = side(flat_away, away_win)
+    return stats
+
+def head_to_head(points, home, away, hg, ag):
+    """
+    Direkter Vergleich: Punkte und Tordifferenz jedes Teams nur aus den Spielen gegen
+    punktgleiche Teams (Mini-Tabelle aller Punktgleichen, pro Simulation).
+    hg/ag dürfen auch (1 x Spiele) sein (z.B. gespielte Spiele, gleich für alle Simulationen).
+    Gezählt werden nur die (wenigen) Spiele zwischen Punktgleichen.
+    """
+    n_sims, n_teams = points.shape
+    sim, game = np.nonzero(points[:, home] == points[:, away])
+    goals_h = np.broadcast_to(hg, (n_sims, len(home)))[sim, game]
+    goals_a = np.broadcast_to(ag, (n_sims, len(home)))[sim, game]
+    flat_home, flat_away = sim * n_teams + home[game], sim * n_teams + away[game]
+    size = n_sims * n_teams
+    side = lambda flat, values: np.bincount(flat, weights=values, minlength=size).reshape(n_sims, n_teams)
+    home_pts = np.where(goals_h > goals_a, 3, np.where(goals_h == goals_a, 1, 0))
+    away_pts = np.where(goals_a > goals_h, 3, np.where(goals_h == goals_a, 1, 0))
+    margin = goals_h.astype(np.int64) - goals_a
+    return side(flat_home, home_pts) + side(flat_away, away_pts), side(flat_home, margin) - side(flat_away, margin)
+
+def rank_table(rule, stats, matches=None, teams=None):
+    """
+    Ranking pro Simulation nach Punkten und den Tiebreakern von rule, per lexsort über (Simulationen x Teams).
+    stats: Kennzahlen wie aus result_stats (alle Teams). matches: (home, away, hg, ag) aller
+    Saisonspiele oder Liste solcher Teile (z.B. gespielt + simuliert), nur für head_to_head nötig.
+    teams: nur diese Team-Indizes ranken (Rest bleibt außen vor).
+    Liefert die Team-Indizes nach Platz als (Simulationen x Plätze) Matrix.
+    """
+    keys = dict(stats)
+    if rule == 'head_to_head':
+        parts = [head_to_head(stats['points'], *part) for part in (matches if isinstance(matches, list) else [matches])]
+        keys['h2h_points'] = sum(p for p, _ in parts)
+        keys['h2h_diff'] = sum(d for _, d in parts)
+    shape = np.shape(stats['points'])
+    columns = [np.broadcast_to(keys[k], shape) for k in ('points',) + TIEBREAK_RULES[rule]]
+    if teams is not None:
+        columns = [c[:, teams] for c in columns]
+    order = np.lexsort(tuple(-c for c in reversed(columns)), axis=-1)
+    return order if teams is None else teams[order]